@@ -0,0 +1,305 @@
+"""Сквозной бенчмарк сервера без графики.
+
+Настоящий Server запускается в отдельном процессе, а из этого процесса к
+нему по loopback подключаются простые боты: по MAX_PLAYERS на комнату, с
+бинарным протоколом, сменой ввода, выстрелами и подтверждением снимков.
+После прогрева измеряются длительности тиков, достигнутая частота,
+трафик на клиента и процессорное время сервера на комнату. Результат
+печатается и может быть сохранен в JSON для сравнения версий:
+
+    python benchmark.py --rooms 8 --duration 20 --output after.json --baseline before.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from bots import InputPolicy, RandomInput
+from core import MAX_PLAYERS
+from metrics import percentile
+from protocol import (DELTA_HEADER, FORMAT_BINARY, MSG_DELTA, MSG_STATE, STATE_HEADER,
+                      encode_message, read_frames)
+from scheduler import TICK_RATE
+
+BENCHMARK_PORT = 5600
+# Метрики, по которым сравниваются прогоны, и направление "лучше"
+COMPARED_METRICS = (
+    ('tick_ms.p50', 'lower'),
+    ('tick_ms.p99', 'lower'),
+    ('achieved_tick_rate', 'higher'),
+    ('cpu_per_room_percent', 'lower'),
+    ('received_bytes_per_client_per_s', 'lower'),
+)
+
+
+def run_server_process(pipe, port, mode, tick_rate):
+    """Процесс сервера: сам сервер в потоке, команды бенчмарка - через pipe"""
+    from server import Server
+
+    # Сообщения о каждом подключении только мешают замеру
+    sys.stdout = open(os.devnull, 'w')
+    server = Server('127.0.0.1', port, tick_rate)
+    threading.Thread(target=server.start, args=(mode,), daemon=True).start()
+
+    cpu_started = time.process_time()
+    ticks_started = 0
+    while True:
+        command = pipe.recv()
+        scheduler = server.scheduler
+        if command == 'reset':
+            cpu_started = time.process_time()
+            ticks_started = scheduler.ticks
+            scheduler.durations.clear()
+            scheduler.overruns = 0
+            scheduler.skipped_ticks = 0
+            pipe.send(None)
+        elif command == 'stats':
+            while True:
+                try:
+                    durations = list(scheduler.durations)
+                    break
+                except RuntimeError:
+                    continue  # Поток тиков дописал длительность во время копирования
+            pipe.send({
+                'cpu_seconds': time.process_time() - cpu_started,
+                'ticks': scheduler.ticks - ticks_started,
+                'durations': durations,
+                'overruns': scheduler.overruns,
+                'skipped_ticks': scheduler.skipped_ticks,
+                'rooms': len(server.rooms),
+                'clients': len(server.clients)
+            })
+        elif command == 'stop':
+            return
+
+
+class Bot:
+    """Простой игрок: случайный ввод и подтверждение каждого снимка"""
+
+    def __init__(self, sock, rng):
+        self.socket = sock
+        self.policy = InputPolicy(RandomInput(), rng)
+        self.buffer = b''
+        self.outgoing = bytearray()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.snapshots = 0
+
+    def send(self, message):
+        self.outgoing += encode_message(message, FORMAT_BINARY)
+
+    def flush(self):
+        if not self.outgoing:
+            return
+        try:
+            sent = self.socket.send(self.outgoing)
+        except (BlockingIOError, InterruptedError):
+            return
+        self.bytes_sent += sent
+        del self.outgoing[:sent]
+
+    def receive(self):
+        try:
+            data = self.socket.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return True
+        if not data:
+            return False
+        self.bytes_received += len(data)
+        frames, self.buffer = read_frames(self.buffer + data)
+        for payload in frames:
+            self.handle(payload)
+        return True
+
+    def handle(self, payload):
+        tag = payload[0]
+        # Из снимков читается только заголовок - полное декодирование
+        # нагрузило бы процесс ботов, а не сервер
+        if tag == MSG_STATE:
+            _, seq, room_id, _, _, _ = STATE_HEADER.unpack_from(payload)
+        elif tag == MSG_DELTA:
+            _, seq, _, room_id, _, _, _, _ = DELTA_HEADER.unpack_from(payload)
+        else:
+            if payload[:1] == b'{' and json.loads(payload)['type'] == 'init':
+                self.outgoing += encode_message({'type': 'init', 'format': FORMAT_BINARY})
+            return
+        self.snapshots += 1
+        self.send({'type': 'ack', 'room_id': room_id, 'seq': seq})
+
+    def step(self, now):
+        """Шаг клиента: новый номер ввода, отправка при смене и раз в heartbeat"""
+        message = self.policy.step(now)
+        if message is not None:
+            self.send(message)
+
+
+def connect(port, attempts=50):
+    for _ in range(attempts):
+        try:
+            bot_socket = socket.create_connection(('127.0.0.1', port))
+            # Как у клиента: мелкие кадры ввода уходят без задержки Нейгла
+            bot_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return bot_socket
+        except ConnectionRefusedError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Сервер на порту {port} не отвечает")
+
+
+def drive_bots(bots, duration):
+    """Цикл ботов в одном потоке: шаги с частотой тиков и обмен данными"""
+    selector = selectors.DefaultSelector()
+    for bot in bots:
+        bot.socket.setblocking(False)
+        selector.register(bot.socket, selectors.EVENT_READ, bot)
+
+    interval = 1.0 / TICK_RATE
+    next_step = time.monotonic()
+    finish = next_step + duration
+    while True:
+        now = time.monotonic()
+        if now >= finish:
+            break
+        if now >= next_step:
+            next_step += interval
+            for bot in bots:
+                bot.step(now)
+        for key, _ in selector.select(max(0.0, min(next_step, finish) - time.monotonic())):
+            if not key.data.receive():
+                selector.unregister(key.fileobj)
+        for bot in bots:
+            bot.flush()
+    selector.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(rooms, duration, warmup, mode, tick_rate, port, seed=0):
+    parent_pipe, child_pipe = multiprocessing.Pipe()
+    server = multiprocessing.Process(
+        target=run_server_process, args=(child_pipe, port, mode, tick_rate), daemon=True)
+    server.start()
+    rng = random.Random(seed)
+    bots = []
+    try:
+        # Подключаемся по одному: сервер заполняет комнаты по порядку
+        for _ in range(rooms * MAX_PLAYERS):
+            bots.append(Bot(connect(port), random.Random(rng.getrandbits(32))))
+
+        drive_bots(bots, warmup)
+        parent_pipe.send('reset')
+        parent_pipe.recv()
+        counters = [(bot.bytes_sent, bot.bytes_received, bot.snapshots) for bot in bots]
+        started = time.monotonic()
+        drive_bots(bots, duration)
+        elapsed = time.monotonic() - started
+        parent_pipe.send('stats')
+        stats = parent_pipe.recv()
+        parent_pipe.send('stop')
+    finally:
+        for bot in bots:
+            bot.socket.close()
+        server.join(timeout=1)
+        if server.is_alive():
+            server.terminate()
+
+    sent = sum(bot.bytes_sent - before[0] for bot, before in zip(bots, counters))
+    received = sum(bot.bytes_received - before[1] for bot, before in zip(bots, counters))
+    snapshots = sum(bot.snapshots - before[2] for bot, before in zip(bots, counters))
+    durations_ms = [duration * 1000 for duration in stats['durations']]
+    clients = len(bots)
+    return {
+        'revision': git_revision(),
+        'config': {'rooms': rooms, 'clients': clients, 'duration': duration,
+                   'warmup': warmup, 'mode': mode, 'tick_rate': tick_rate},
+        'server_rooms': stats['rooms'],
+        'tick_ms': {
+            'p50': percentile(durations_ms, 0.5),
+            'p90': percentile(durations_ms, 0.9),
+            'p99': percentile(durations_ms, 0.99),
+            'max': max(durations_ms, default=0.0),
+            'mean': sum(durations_ms) / len(durations_ms) if durations_ms else 0.0
+        },
+        'achieved_tick_rate': stats['ticks'] / elapsed,
+        'overruns': stats['overruns'],
+        'skipped_ticks': stats['skipped_ticks'],
+        'sent_bytes_per_client_per_s': sent / clients / elapsed,
+        'received_bytes_per_client_per_s': received / clients / elapsed,
+        'snapshots_per_client_per_s': snapshots / clients / elapsed,
+        'server_cpu_percent': 100 * stats['cpu_seconds'] / elapsed,
+        'cpu_per_room_percent': 100 * stats['cpu_seconds'] / elapsed / max(1, stats['rooms'])
+    }
+
+
+def metric(results, path):
+    value = results
+    for key in path.split('.'):
+        value = value[key]
+    return value
+
+
+def compare(results, baseline):
+    """Строки сравнения с прошлым прогоном по ключевым метрикам"""
+    lines = []
+    for path, better in COMPARED_METRICS:
+        old, new = metric(baseline, path), metric(results, path)
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change > 0 if better == 'lower' else change < 0
+        mark = " (хуже)" if worse and abs(change) >= 5 else ""
+        lines.append(f"  {path}: {old:.3f} -> {new:.3f} ({change:+.1f}%){mark}")
+    return lines
+
+
+def run_cli():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк сервера")
+    parser.add_argument("--rooms", type=int, default=4,
+                        help=f"число комнат по {MAX_PLAYERS} бота")
+    parser.add_argument("--duration", type=float, default=10, help="длительность замера, с")
+    parser.add_argument("--warmup", type=float, default=2, help="прогрев перед замером, с")
+    parser.add_argument("--mode", choices=("threads", "event"), default="event")
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE)
+    parser.add_argument("--port", type=int, default=BENCHMARK_PORT)
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.rooms, args.duration, args.warmup,
+                            args.mode, args.tick_rate, args.port)
+    tick = results['tick_ms']
+    print(f"[BENCH] {results['config']['clients']} клиентов в {results['server_rooms']} комнатах, "
+          f"режим {args.mode}, {args.duration:.0f} с")
+    print(f"[BENCH] Тик: p50 {tick['p50']:.2f} мс, p90 {tick['p90']:.2f} мс, "
+          f"p99 {tick['p99']:.2f} мс, макс. {tick['max']:.2f} мс")
+    print(f"[BENCH] Частота тиков {results['achieved_tick_rate']:.1f}/{args.tick_rate}, "
+          f"перегрузок {results['overruns']}, пропущено шагов {results['skipped_ticks']}")
+    print(f"[BENCH] На клиента: принято {results['received_bytes_per_client_per_s'] / 1024:.1f} КБ/с, "
+          f"отправлено {results['sent_bytes_per_client_per_s']:.0f} Б/с, "
+          f"снимков {results['snapshots_per_client_per_s']:.1f}/с")
+    print(f"[BENCH] CPU сервера {results['server_cpu_percent']:.1f}%, "
+          f"на комнату {results['cpu_per_room_percent']:.2f}%")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"[BENCH] Сравнение с {args.baseline} ({baseline.get('revision')}):")
+        for line in compare(results, baseline):
+            print(line)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    run_cli()
@@ -0,0 +1,70 @@
+"""Ввод ботов генераторов нагрузки (benchmark.py и swarm.py).
+
+Бот шлет ввод так же, как client.py: номер ввода - номер шага, сообщение
+уходит при смене команды, при выстреле и раз в INPUT_HEARTBEAT_TICKS шагов.
+Источник ввода - случайный (RandomInput) или любой объект с next(rng).
+"""
+from core import SCREEN_HEIGHT, SCREEN_WIDTH
+from protocol import INPUT_HEARTBEAT_TICKS, client_time_ms
+from scheduler import TICK_RATE
+
+# Частота смены случайного ввода, с
+INPUT_CHANGE_INTERVAL = 0.5
+# Вероятность выстрела при смене ввода
+SHOOT_PROBABILITY = 0.3
+COMMAND_FIELDS = ('left', 'right', 'jump')
+
+
+class RandomInput:
+    """Случайное движение, прыжки и выстрелы в случайную точку экрана"""
+
+    def __init__(self, tick_rate=TICK_RATE):
+        self.tick_rate = tick_rate
+        self.current = {}
+        self.ticks_left = 0
+
+    def next(self, rng):
+        if self.ticks_left > 0:
+            self.ticks_left -= 1
+            return self.current
+        self.ticks_left = int(INPUT_CHANGE_INTERVAL * self.tick_rate * rng.uniform(0.5, 1.5))
+        direction = rng.choice(('left', 'right', None))
+        self.current = {
+            'left': direction == 'left',
+            'right': direction == 'right',
+            'jump': rng.random() < 0.5
+        }
+        if rng.random() < SHOOT_PROBABILITY:
+            # Выстрел однократный, последующие шаги его не повторяют
+            return dict(self.current, shoot=True, mouse_x=rng.randint(0, SCREEN_WIDTH),
+                        mouse_y=rng.randint(0, SCREEN_HEIGHT))
+        return self.current
+
+
+class InputPolicy:
+    """Номера шагов бота и решение, отправлять ли ввод очередного шага"""
+
+    def __init__(self, inputs, rng):
+        self.inputs = inputs
+        self.rng = rng
+        self.input_seq = 0
+        self.sent_command = None
+        self.sent_seq = 0
+
+    def step(self, now):
+        """Сообщение ввода для нового шага или None, если слать нечего"""
+        self.input_seq += 1
+        state = self.inputs.next(self.rng)
+        command = {name: bool(state.get(name)) for name in COMMAND_FIELDS}
+        shoot = bool(state.get('shoot'))
+        if (command == self.sent_command and not shoot
+                and self.input_seq - self.sent_seq < INPUT_HEARTBEAT_TICKS):
+            return None
+        message = {'type': 'input', 'seq': self.input_seq, 't': client_time_ms(now),
+                   'shoot': shoot, **command}
+        if shoot:
+            message['mouse_x'] = state.get('mouse_x', SCREEN_WIDTH // 2)
+            message['mouse_y'] = state.get('mouse_y', SCREEN_HEIGHT // 2)
+        self.sent_command = command
+        self.sent_seq = self.input_seq
+        return message
@@ -0,0 +1,110 @@
+"""Пул пуль в виде структуры массивов NumPy.
+
+Вместо объекта Bullet с собственным pygame.Rect на каждый выстрел пули
+хранятся в непрерывных массивах координат, скоростей и владельцев.
+Движение, отсечение вылетевших за экран и проверка попаданий выполняются
+векторно, а освободившиеся ячейки переиспользуются.
+"""
+import numpy as np
+
+INITIAL_CAPACITY = 64
+
+
+def _round_coords(values):
+    # pygame.Rect округляет дробные координаты от нуля - повторяем это,
+    # чтобы попадания совпадали с проверкой colliderect
+    return np.trunc(values + np.copysign(0.5, values)).astype(np.int64)
+
+
+class BulletPool:
+    def __init__(self, size, width, height, capacity=INITIAL_CAPACITY):
+        self.size = size
+        self.width = width
+        self.height = height
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vel_x = np.zeros(capacity)
+        self.vel_y = np.zeros(capacity)
+        self.owner = np.zeros(capacity, dtype=np.int64)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        # Свободные ячейки; берутся с конца, поэтому младшие заполняются первыми
+        self.free = list(range(capacity - 1, -1, -1))
+        self.next_id = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = len(self.alive)
+        for name in ('x', 'y', 'vel_x', 'vel_y', 'owner', 'ids', 'alive'):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def spawn(self, owner_id, x, y, vel_x, vel_y, bullet_id=None):
+        if not self.free:
+            self._grow()
+        slot = self.free.pop()
+        if bullet_id is None:
+            bullet_id = self.next_id
+            self.next_id += 1
+        self.x[slot] = x
+        self.y[slot] = y
+        self.vel_x[slot] = vel_x
+        self.vel_y[slot] = vel_y
+        self.owner[slot] = owner_id
+        self.ids[slot] = bullet_id
+        self.alive[slot] = True
+        self.count += 1
+        return bullet_id
+
+    def release(self, slots):
+        if len(slots) == 0:
+            return
+        self.alive[slots] = False
+        # Обнуляем скорость, чтобы свободные ячейки не уплывали при step()
+        self.vel_x[slots] = 0
+        self.vel_y[slots] = 0
+        self.free.extend(np.asarray(slots).tolist())
+        self.count -= len(slots)
+
+    def step(self):
+        """Сдвигает все пули и освобождает вылетевшие за пределы экрана"""
+        if not self.count:
+            return
+        self.x += self.vel_x
+        self.y += self.vel_y
+        outside = self.alive & ((self.x < 0) | (self.x > self.width) |
+                                (self.y < 0) | (self.y > self.height))
+        self.release(np.flatnonzero(outside))
+
+    def hits(self, rect, exclude_owner):
+        """Ячейки живых пуль, пересекающих rect, кроме пуль exclude_owner"""
+        if not self.count:
+            return np.empty(0, dtype=np.int64)
+        left = _round_coords(self.x)
+        top = _round_coords(self.y)
+        mask = (self.alive & (self.owner != exclude_owner) &
+                (left < rect.right) & (left + self.size > rect.left) &
+                (top < rect.bottom) & (top + self.size > rect.top))
+        return np.flatnonzero(mask)
+
+    def snapshot(self):
+        """Живые пули в виде словарей по id (обычные типы Python для JSON)"""
+        slots = np.flatnonzero(self.alive)
+        bullets = {}
+        for bullet_id, owner_id, x, y, vel_x, vel_y in zip(
+                self.ids[slots].tolist(), self.owner[slots].tolist(),
+                self.x[slots].tolist(), self.y[slots].tolist(),
+                self.vel_x[slots].tolist(), self.vel_y[slots].tolist()):
+            bullets[bullet_id] = {
+                'id': bullet_id,
+                'owner_id': owner_id,
+                'x': x,
+                'y': y,
+                'vel_x': vel_x,
+                'vel_y': vel_y
+            }
+        return bullets
@@ -1,10 +1,18 @@
 import pygame
 import socket
 import threading
-import json
 import random
 import os
+import hashlib
+import inspect
+import json
+import time
+from collections import OrderedDict, deque
 from pygame.locals import *
+from snapshot import HISTORY_SIZE, apply_delta, normalize_state
+from protocol import (FORMAT_BINARY, FORMAT_JSON, INPUT_HEARTBEAT_TICKS, client_time_ms,
+                      encode_message, decode_message, read_frames)
+from metrics import percentile
 
 pygame.init()
 
@@ -21,6 +29,30 @@ MAX_PLAYERS = 4
 PORT = 5555
 SERVER_IP = "127.0.0.1"
 WIN_SCORE = 5  # Количество очков для победы
+WIRE_FORMAT = FORMAT_BINARY  # FORMAT_JSON для отладки протокола
+TICK_RATE = 30  # Частота шагов симуляции сервера
+TICK_INTERVAL = 1 / TICK_RATE
+# Сколько неподтвержденных вводов хранится для повторного применения
+MAX_PENDING_INPUTS = 64
+# Чужие игроки и пули рисуются с задержкой между двумя принятыми снимками
+INTERPOLATION_DELAY = 0.1
+# Сколько снимков хранится для интерполяции (~0.5 секунды при 30 тиках)
+INTERPOLATION_BUFFER_SIZE = 16
+# Сколько отрисованных надписей хранится в кэше текста
+TEXT_CACHE_SIZE = 128
+# Дольше этого позиции при опоздании снимков не экстраполируются
+MAX_EXTRAPOLATION = 0.25
+# Как часто измерять RTT сообщениями ping, секунд
+PING_INTERVAL = 1.0
+# Сколько последних замеров каждой задержки хранится для перцентилей
+LATENCY_SAMPLES = 256
+# Как часто печатать сводку задержек, секунд
+LATENCY_REPORT_INTERVAL = 10
+# Панель диагностики (F3): длина кольцевых буферов, период обновления
+# панели в секундах и размер одного графика
+DIAGNOSTICS_SAMPLES = 120
+DIAGNOSTICS_REFRESH = 0.25
+SPARKLINE_SIZE = (120, 18)
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -29,13 +61,15 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 YELLOW = (255, 255, 0)
 
-if not os.path.exists("assets"):
-    os.makedirs("assets")
+ASSETS_DIR = "assets"
+ASSET_MANIFEST = os.path.join(ASSETS_DIR, "manifest.json")
+# Облака на фоне раскладываются детерминированно, чтобы фон можно было кэшировать
+BACKGROUND_SEED = 2024
+PLAYER_COLORS = [BLUE, RED, GREEN, YELLOW]
 
 
-def create_player_image(color, player_id):
-    player_surface = pygame.Surface(
-        (PLAYER_SIZE, PLAYER_SIZE), pygame.SRCALPHA)
+def create_player_image(color, player_id, size):
+    player_surface = pygame.Surface((size, size), pygame.SRCALPHA)
     pygame.draw.rect(player_surface, color, (8, 8, 16, 24))
     pygame.draw.circle(player_surface, (255, 220, 175), (16, 8), 8)
     pygame.draw.circle(player_surface, BLACK, (14, 6), 2)
@@ -43,42 +77,141 @@ def create_player_image(color, player_id):
     font = pygame.font.Font(None, 20)
     text = font.render(str(player_id), True, WHITE)
     player_surface.blit(text, (13, 14))
-    filename = f"assets/player_{player_id}.png"
-    pygame.image.save(player_surface, filename)
-    return filename
+    return player_surface
 
 
-def create_bullet_image():
-    bullet_surface = pygame.Surface(
-        (BULLET_SIZE, BULLET_SIZE), pygame.SRCALPHA)
-    pygame.draw.circle(bullet_surface, RED, (BULLET_SIZE //
-                       2, BULLET_SIZE//2), BULLET_SIZE//2)
-    filename = "assets/bullet.png"
-    pygame.image.save(bullet_surface, filename)
-    return filename
+def create_bullet_image(size):
+    bullet_surface = pygame.Surface((size, size), pygame.SRCALPHA)
+    pygame.draw.circle(bullet_surface, RED, (size//2, size//2), size//2)
+    return bullet_surface
 
 
-def create_background_image():
-    bg_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+def create_background_image(width, height, seed):
+    rng = random.Random(seed)
+    bg_surface = pygame.Surface((width, height))
     bg_surface.fill((135, 206, 235))
     pygame.draw.circle(bg_surface, YELLOW, (700, 100), 50)
     for i in range(5):
-        x = random.randint(50, SCREEN_WIDTH - 100)
-        y = random.randint(50, 200)
-        size = random.randint(30, 70)
+        x = rng.randint(50, width - 100)
+        y = rng.randint(50, 200)
+        size = rng.randint(30, 70)
         pygame.draw.ellipse(bg_surface, WHITE, (x, y, size*2, size))
         pygame.draw.ellipse(bg_surface, WHITE,
                             (x+size//2, y-size//4, size*2, size))
         pygame.draw.ellipse(bg_surface, WHITE, (x+size, y, size*2, size))
-    filename = "assets/background.png"
-    pygame.image.save(bg_surface, filename)
-    return filename
+    return bg_surface
+
+
+# Имя ресурса -> (функция генерации, параметры)
+ASSET_SPECS = {
+    f"player_{i+1}": (create_player_image, (color, i+1, PLAYER_SIZE))
+    for i, color in enumerate(PLAYER_COLORS)
+}
+ASSET_SPECS["bullet"] = (create_bullet_image, (BULLET_SIZE,))
+ASSET_SPECS["background"] = (create_background_image,
+                             (SCREEN_WIDTH, SCREEN_HEIGHT, BACKGROUND_SEED))
+
+
+def player_asset(player_id):
+    return f"player_{player_id % len(PLAYER_COLORS) + 1}"
+
+
+class AssetStore:
+    """Сгенерированные ресурсы на диске с манифестом хэшей.
+
+    Хэш строится по исходному коду функции генерации и ее параметрам:
+    если он совпадает с манифестом и файл есть, изображение просто
+    загружается, иначе генерируется в памяти и используется сразу,
+    а на диск записывается в фоне для следующих запусков.
+    """
 
+    def __init__(self, directory=ASSETS_DIR, manifest_path=ASSET_MANIFEST):
+        self.directory = directory
+        self.manifest_path = manifest_path
+        self.lock = threading.Lock()
+        try:
+            with open(manifest_path, encoding="utf-8") as manifest_file:
+                self.manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    @staticmethod
+    def asset_hash(generator, params):
+        digest = hashlib.sha1(inspect.getsource(generator).encode("utf-8"))
+        digest.update(repr(params).encode("utf-8"))
+        return digest.hexdigest()
+
+    def load(self, name):
+        generator, params = ASSET_SPECS[name]
+        asset_hash = self.asset_hash(generator, params)
+        path = os.path.join(self.directory, name + ".png")
+        if self.manifest.get(name) == asset_hash and os.path.exists(path):
+            return pygame.image.load(path)
+
+        surface = generator(*params)
+        threading.Thread(target=self.save, args=(name, surface.copy(), path, asset_hash),
+                         daemon=True).start()
+        return surface
+
+    def save(self, name, surface, path, asset_hash):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            pygame.image.save(surface, path)
+            with self.lock:
+                self.manifest[name] = asset_hash
+                with open(self.manifest_path, "w", encoding="utf-8") as manifest_file:
+                    json.dump(self.manifest, manifest_file, indent=2, sort_keys=True)
+        except (OSError, pygame.error) as e:
+            print(f"[CLIENT] Не удалось сохранить ресурс {name}: {e}")
+
+
+class SpriteCache:
+    """Каждый ресурс готовится один раз и хранится уже преобразованным
+    под формат экрана (convert/convert_alpha)"""
+
+    def __init__(self, store):
+        self.store = store
+        self.surfaces = {}
+
+    def get(self, name, alpha=True):
+        surface = self.surfaces.get(name)
+        if surface is None:
+            surface = self.store.load(name)
+            # Преобразовать можно только после создания окна
+            if pygame.display.get_surface() is not None:
+                surface = surface.convert_alpha() if alpha else surface.convert()
+            self.surfaces[name] = surface
+        return surface
+
+
+sprites = SpriteCache(AssetStore())
+
+
+class TextCache:
+    """LRU-кэш отрисованных надписей по (шрифт, текст, цвет).
+
+    Числа здоровья, строки счета и подписи меняются редко, поэтому
+    font.render вызывается только для новых сочетаний.
+    """
+
+    def __init__(self, size=TEXT_CACHE_SIZE):
+        self.size = size
+        self.surfaces = OrderedDict()
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, True, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.size:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
 
-player_images = [create_player_image(
-    color, i+1) for i, color in enumerate([BLUE, RED, GREEN, YELLOW])]
-bullet_image = create_bullet_image()
-background_image = create_background_image()
+
+texts = TextCache()
 
 
 class Player:
@@ -91,11 +224,28 @@ class Player:
         self.is_jumping = False
         self.health = 100
         self.score = 0
-        self.image = pygame.image.load(
-            player_images[player_id % len(player_images)])
+        self.input_seq = 0
+        self.image = sprites.get(player_asset(player_id))
         self.rect = pygame.Rect(x, y, PLAYER_SIZE, PLAYER_SIZE)
 
     def update(self, platforms):
+        self.step(platforms)
+
+        if self.y > SCREEN_HEIGHT:
+            self.x = random.randint(50, SCREEN_WIDTH - 50)
+            self.y = 0
+            self.vel_y = 0
+            self.health -= 25
+
+        if self.y < 10 and self.y > 0:
+            self.score += 1
+            self.x = random.randint(50, SCREEN_WIDTH - 50)
+            self.y = SCREEN_HEIGHT - 100
+            self.vel_y = 0
+
+    def step(self, platforms):
+        """Физика движения без правил сервера (урон, очки, возрождение) -
+        ее клиент повторяет при предсказании своего игрока"""
         self.vel_y += GRAVITY
         self.x += self.vel_x
         self.y += self.vel_y
@@ -122,17 +272,17 @@ class Player:
 
         self.is_jumping = not on_ground
 
-        if self.y > SCREEN_HEIGHT:
-            self.x = random.randint(50, SCREEN_WIDTH - 50)
-            self.y = 0
-            self.vel_y = 0
-            self.health -= 25
+    def apply_input(self, command):
+        # Тот же порядок, что и при обработке ввода на сервере
+        if command['left']:
+            self.move_left()
+        elif command['right']:
+            self.move_right()
+        else:
+            self.stop()
 
-        if self.y < 10 and self.y > 0:
-            self.score += 1
-            self.x = random.randint(50, SCREEN_WIDTH - 50)
-            self.y = SCREEN_HEIGHT - 100
-            self.vel_y = 0
+        if command['jump']:
+            self.jump()
 
     def jump(self):
         if not self.is_jumping:
@@ -169,17 +319,32 @@ class Player:
         player.vel_y = data['vel_y']
         player.health = data['health']
         player.score = data['score']
+        player.is_jumping = bool(data.get('is_jumping', False))
+        player.input_seq = data.get('input_seq', 0)
         return player
 
+    def apply_dict(self, data):
+        self.x = data['x']
+        self.y = data['y']
+        self.vel_x = data['vel_x']
+        self.vel_y = data['vel_y']
+        self.health = data['health']
+        self.score = data['score']
+        self.is_jumping = bool(data.get('is_jumping', False))
+        self.input_seq = data.get('input_seq', 0)
+        self.rect.x = self.x
+        self.rect.y = self.y
+
 
 class Bullet:
-    def __init__(self, owner_id, x, y):
+    def __init__(self, owner_id, x, y, bullet_id=0):
+        self.id = bullet_id
         self.owner_id = owner_id
         self.x = x
         self.y = y
         self.vel_x = 0
         self.vel_y = -BULLET_SPEED
-        self.image = pygame.image.load(bullet_image)
+        self.image = sprites.get("bullet")
         self.rect = pygame.Rect(x, y, BULLET_SIZE, BULLET_SIZE)
 
     def update(self):
@@ -204,11 +369,19 @@ class Bullet:
 
     @staticmethod
     def from_dict(data):
-        bullet = Bullet(data['owner_id'], data['x'], data['y'])
+        bullet = Bullet(data['owner_id'], data['x'], data['y'], data.get('id', 0))
         bullet.vel_x = data['vel_x']
         bullet.vel_y = data['vel_y']
         return bullet
 
+    def apply_dict(self, data):
+        self.x = data['x']
+        self.y = data['y']
+        self.vel_x = data['vel_x']
+        self.vel_y = data['vel_y']
+        self.rect.x = self.x
+        self.rect.y = self.y
+
 
 class Platform:
     def __init__(self, x, y, width):
@@ -247,7 +420,7 @@ class Button:
         pygame.draw.rect(screen, color, self.rect)
         pygame.draw.rect(screen, WHITE, self.rect, 2)  # Border
 
-        text_surface = self.font.render(self.text, True, WHITE)
+        text_surface = texts.render(self.font, self.text, WHITE)
         text_rect = text_surface.get_rect(center=self.rect.center)
         screen.blit(text_surface, text_rect)
 
@@ -262,21 +435,372 @@ class Room:
     def __init__(self, room_id):
         self.id = room_id
         self.players = {}
-        self.bullets = []
+        self.bullets = {}
         self.platforms = []
-        self.background = pygame.image.load(background_image)
+        self.platforms_data = None
+        self.background = sprites.get("background", alpha=False)
 
     @staticmethod
     def from_dict(data):
         room = Room(data['id'])
-        room.players = {int(player_id): Player.from_dict(player_data)
-                        for player_id, player_data in data['players'].items()}
-        room.bullets = [Bullet.from_dict(bullet_data)
-                        for bullet_data in data['bullets']]
-        room.platforms = [Platform.from_dict(
-            platform_data) for platform_data in data['platforms']]
+        room.apply_dict(data)
         return room
 
+    def apply_dict(self, data):
+        """Применяет снимок к существующим объектам, создавая только новые сущности"""
+        self.id = data['id']
+        self.players = self._apply_entities(
+            self.players, {int(player_id): player_data
+                           for player_id, player_data in data['players'].items()}, Player)
+        self.bullets = self._apply_entities(
+            self.bullets, {bullet_data['id']: bullet_data
+                           for bullet_data in data['bullets']}, Bullet)
+        # Платформы меняются только с полным снимком
+        if data['platforms'] is not self.platforms_data:
+            self.platforms_data = data['platforms']
+            self.platforms = [Platform.from_dict(
+                platform_data) for platform_data in data['platforms']]
+
+    @staticmethod
+    def _apply_entities(entities, entities_data, entity_class):
+        for entity_id in [entity_id for entity_id in entities if entity_id not in entities_data]:
+            del entities[entity_id]
+        for entity_id, entity_data in entities_data.items():
+            entity = entities.get(entity_id)
+            if entity is None:
+                entities[entity_id] = entity_class.from_dict(entity_data)
+            else:
+                entity.apply_dict(entity_data)
+        return entities
+
+
+class SnapshotBuffer:
+    """Кольцевой буфер позиций из принятых снимков для интерполяции.
+
+    Время снимка считается по его номеру (один снимок на тик сервера), а
+    смещение до локальных часов - по самому раннему приходу, поэтому
+    неравномерная доставка пакетов не превращается в рывки на экране.
+    """
+
+    def __init__(self, size=INTERPOLATION_BUFFER_SIZE, interval=TICK_INTERVAL):
+        self.snapshots = deque(maxlen=size)
+        self.interval = interval
+        self.offset = None
+
+    def clear(self):
+        self.snapshots.clear()
+        self.offset = None
+
+    def push(self, seq, received_at, state):
+        server_time = seq * self.interval
+        if self.snapshots and server_time <= self.snapshots[-1][0]:
+            # Номера пошли заново (комната создана повторно)
+            self.clear()
+        offset = received_at - server_time
+        if self.offset is None or offset < self.offset:
+            self.offset = offset
+        else:
+            # Медленно отпускаем минимум, чтобы пережить дрейф часов
+            self.offset += (offset - self.offset) * 0.01
+        positions = {}
+        for kind in ('players', 'bullets'):
+            for entity_id, fields in state[kind].items():
+                positions[(kind, entity_id)] = (
+                    fields['x'], fields['y'], fields['vel_x'], fields['vel_y'])
+        self.snapshots.append((server_time, positions))
+
+    def sample(self, now, delay=INTERPOLATION_DELAY):
+        """Позиции сущностей на момент now - delay: (вид, id) -> (x, y)"""
+        if not self.snapshots:
+            return None
+        render_time = now - self.offset - delay
+        first_time, first = self.snapshots[0]
+        if render_time <= first_time:
+            return {key: (x, y) for key, (x, y, _, _) in first.items()}
+
+        last_time, last = self.snapshots[-1]
+        if render_time >= last_time:
+            # Снимки опаздывают - продолжаем движение по скорости, но недолго
+            ticks = min(render_time - last_time, MAX_EXTRAPOLATION) / self.interval
+            return {key: (x + vel_x * ticks, y + vel_y * ticks)
+                    for key, (x, y, vel_x, vel_y) in last.items()}
+
+        for index in range(len(self.snapshots) - 1, 0, -1):
+            start_time, start = self.snapshots[index - 1]
+            if start_time <= render_time:
+                end_time, end = self.snapshots[index]
+                break
+        t = (render_time - start_time) / (end_time - start_time)
+        positions = {}
+        for key, (x, y, _, _) in end.items():
+            previous = start.get(key)
+            if previous is None:
+                positions[key] = (x, y)
+            else:
+                positions[key] = (previous[0] + (x - previous[0]) * t,
+                                  previous[1] + (y - previous[1]) * t)
+        return positions
+
+
+class LatencyTracker:
+    """Задержки, которые видит игрок: сеть (RTT), ввод -> снимок, в котором
+    сервер его применил, и ввод -> первый кадр на экране с этим снимком"""
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = {name: deque(maxlen=size) for name in ('rtt', 'applied', 'visible')}
+        # (номер, время отправки) вводов, еще не подтвержденных сервером
+        self.sent = deque(maxlen=MAX_PENDING_INPUTS)
+        # Время отправки подтвержденных вводов, которые еще не отрисованы
+        self.confirmed = []
+        self.last_report = time.monotonic()
+
+    def input_sent(self, seq, sent_at):
+        self.sent.append((seq, sent_at))
+
+    def snapshot_applied(self, input_seq, received_at):
+        while self.sent and self.sent[0][0] <= input_seq:
+            sent_at = self.sent.popleft()[1]
+            self.samples['applied'].append(received_at - sent_at)
+            self.confirmed.append(sent_at)
+
+    def frame_shown(self, now):
+        for sent_at in self.confirmed:
+            self.samples['visible'].append(now - sent_at)
+        self.confirmed.clear()
+
+    def pong(self, sent_ms, received_at):
+        self.samples['rtt'].append(((client_time_ms(received_at) - sent_ms) & 0xFFFFFFFF) / 1000)
+
+    def clear(self):
+        self.sent.clear()
+        self.confirmed.clear()
+
+    def summary(self):
+        """Медиана и 95-й перцентиль каждой задержки, миллисекунд"""
+        return {name: (percentile(values, 0.5) * 1000, percentile(values, 0.95) * 1000)
+                for name, values in self.samples.items()}
+
+    def report(self, now):
+        if now - self.last_report < LATENCY_REPORT_INTERVAL:
+            return
+        self.last_report = now
+        summary = self.summary()
+        print("[CLIENT] Задержки p50/p95: "
+              f"RTT {summary['rtt'][0]:.0f}/{summary['rtt'][1]:.0f} мс, "
+              f"ввод -> снимок {summary['applied'][0]:.0f}/{summary['applied'][1]:.0f} мс, "
+              f"ввод -> экран {summary['visible'][0]:.0f}/{summary['visible'][1]:.0f} мс")
+
+
+def last(values):
+    return values[-1] if values else 0.0
+
+
+def draw_sparkline(surface, values, rect):
+    """Мини-график значений, масштабированный по максимуму буфера"""
+    pygame.draw.rect(surface, (60, 60, 60), rect, 1)
+    values = list(values)
+    if len(values) < 2:
+        return
+    top = max(values) or 1.0
+    step = (rect.width - 1) / (len(values) - 1)
+    points = [(rect.left + index * step,
+               rect.bottom - 1 - (value / top) * (rect.height - 2))
+              for index, value in enumerate(values)]
+    pygame.draw.lines(surface, GREEN, False, points)
+
+
+class Diagnostics:
+    """Замеры сети и отрисовки в кольцевых буферах и панель с графиками.
+
+    Байты и снимки копятся счетчиками и раз в секунду переносятся в буферы
+    посекундных значений; длительности пишутся по каждому замеру.
+    Панель собирается заново не чаще DIAGNOSTICS_REFRESH, а между
+    обновлениями выводится готовая поверхность.
+    """
+
+    def __init__(self, size=DIAGNOSTICS_SAMPLES):
+        self.visible = False
+        self.font = pygame.font.Font(None, 20)
+        self.series = {name: deque(maxlen=size) for name in (
+            'interval', 'rate', 'bytes_in', 'bytes_out', 'decode', 'apply', 'frame')}
+        # Счетчики текущей секунды: прием дописывает их из своего потока,
+        # а update() читает и обнуляет из основного, поэтому под блокировкой
+        self.lock = threading.Lock()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.snapshots = 0
+        self.second_started = time.monotonic()
+        self.last_snapshot_at = None
+        self.panel = None
+        self.panel_built_at = 0.0
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.panel = None
+
+    def count_in(self, size):
+        with self.lock:
+            self.bytes_in += size
+
+    def count_out(self, size):
+        with self.lock:
+            self.bytes_out += size
+
+    def snapshot_received(self, received_at, decode_time):
+        self.series['decode'].append(decode_time * 1e6)
+        if self.last_snapshot_at is not None:
+            self.series['interval'].append((received_at - self.last_snapshot_at) * 1000)
+        self.last_snapshot_at = received_at
+        with self.lock:
+            self.snapshots += 1
+
+    def snapshot_applied(self, apply_time):
+        self.series['apply'].append(apply_time * 1e6)
+
+    def frame_rendered(self, frame_time):
+        self.series['frame'].append(frame_time * 1000)
+
+    def update(self, now):
+        elapsed = now - self.second_started
+        if elapsed < 1.0:
+            return
+        with self.lock:
+            snapshots, bytes_in, bytes_out = self.snapshots, self.bytes_in, self.bytes_out
+            self.bytes_in = self.bytes_out = self.snapshots = 0
+        self.series['rate'].append(snapshots / elapsed)
+        self.series['bytes_in'].append(bytes_in / elapsed)
+        self.series['bytes_out'].append(bytes_out / elapsed)
+        self.second_started = now
+
+    def surface(self, now, latency):
+        """Панель для вывода поверх кадра"""
+        if self.panel is None or now - self.panel_built_at >= DIAGNOSTICS_REFRESH:
+            self.panel = self.build_panel(latency)
+            self.panel_built_at = now
+        return self.panel
+
+    def build_panel(self, latency):
+        series = self.series
+        rtt = [value * 1000 for value in latency.samples['rtt']]
+        intervals = list(series['interval'])
+        mean = sum(intervals) / len(intervals) if intervals else 0.0
+        jitter = (sum((value - mean) ** 2 for value in intervals) / len(intervals)) ** 0.5 \
+            if intervals else 0.0
+        rows = [
+            (f"RTT {last(rtt):.0f} мс", rtt),
+            (f"Снимки {last(series['rate']):.1f}/с, разброс {jitter:.1f} мс", intervals),
+            (f"Прием {last(series['bytes_in']) / 1024:.1f} КБ/с", series['bytes_in']),
+            (f"Отправка {last(series['bytes_out']):.0f} Б/с", series['bytes_out']),
+            (f"Декод. {percentile(series['decode'], 0.5):.0f} мкс, "
+             f"примен. {percentile(series['apply'], 0.5):.0f} мкс", series['decode']),
+            (f"Кадр {percentile(series['frame'], 0.5):.1f} мс, "
+             f"макс. {max(series['frame'], default=0.0):.1f} мс", series['frame']),
+        ]
+
+        width, height = SPARKLINE_SIZE
+        row_height = height + 4
+        text_width = 250
+        panel = pygame.Surface((text_width + width + 12, row_height * len(rows) + 8),
+                               pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for index, (label, values) in enumerate(rows):
+            top = 4 + index * row_height
+            panel.blit(self.font.render(label, True, WHITE), (6, top + 3))
+            draw_sparkline(panel, values, pygame.Rect(text_width + 6, top, width, height))
+        return panel
+
+
+class Renderer:
+    """Отрисовка слоями с обновлением только изменившихся областей экрана.
+
+    Фон, платформы и финишная линия один раз на уровень собираются в
+    статичный слой. Каждый кадр под прошлыми спрайтами восстанавливается
+    этот слой, поверх рисуются новые спрайты, и на экран выводятся только
+    затронутые прямоугольники. Затемнение под сообщениями перекрывает весь
+    экран, поэтому такие кадры выводятся целиком.
+    """
+
+    def __init__(self, screen, font):
+        self.screen = screen
+        self.font = font
+        self.static_layer = None
+        self.static_platforms = None
+        # Затемнение экрана общее для всех сообщений
+        self.shade = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        self.shade.fill((0, 0, 0, 180))  # RGBA: черный с 70% прозрачности
+        self.message_boxes = {}
+        self.drawn_rects = []
+        self.previous_rects = []
+        self.full_frame = True
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Следующий кадр перерисовывается и выводится целиком"""
+        self.full_redraw = True
+
+    def set_level(self, room):
+        # Список платформ пересоздается только при смене уровня
+        if room.platforms is self.static_platforms:
+            return
+        self.static_platforms = room.platforms
+        layer = room.background.copy()
+        for platform in room.platforms:
+            platform.draw(layer)
+
+        # Финишная линия
+        pygame.draw.rect(layer, RED, (0, 0, SCREEN_WIDTH, 10))
+        finish_text = texts.render(self.font, "ФИНИШ", WHITE)
+        layer.blit(finish_text, (SCREEN_WIDTH//2 - finish_text.get_width()//2, 10))
+        self.static_layer = layer
+        self.invalidate()
+
+    def begin_frame(self):
+        if self.full_redraw:
+            self.screen.blit(self.static_layer, (0, 0))
+        else:
+            # Стираем спрайты прошлого кадра кусками статичного слоя
+            for rect in self.previous_rects:
+                self.screen.blit(self.static_layer, rect, rect)
+        self.full_frame = self.full_redraw
+        self.full_redraw = False
+        self.drawn_rects = []
+
+    def blit(self, surface, position):
+        self.drawn_rects.append(self.screen.blit(surface, position))
+
+    def draw_rect(self, color, rect, width=0):
+        self.drawn_rects.append(pygame.draw.rect(self.screen, color, rect, width))
+
+    def shade_screen(self):
+        self.screen.blit(self.shade, (0, 0))
+        self.full_frame = True
+        # Под затемнением весь экран отличается от статичного слоя
+        self.full_redraw = True
+
+    def message_box(self, text, color, font):
+        """Табличка с текстом в рамке, собранная один раз на текст и цвет"""
+        key = (text, color, font)
+        box = self.message_boxes.get(key)
+        if box is None:
+            text_surface = font.render(text, True, color)
+
+            # Добавляем рамку вокруг сообщения
+            padding = 20
+            box = pygame.Surface((text_surface.get_width() + padding*2,
+                                  text_surface.get_height() + padding*2))
+            box.fill((50, 50, 50))
+            pygame.draw.rect(box, color, box.get_rect(), 3)
+            box.blit(text_surface, (padding, padding))
+            self.message_boxes[key] = box
+        return box
+
+    def end_frame(self):
+        if self.full_frame:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.previous_rects + self.drawn_rects)
+        self.previous_rects = self.drawn_rects
+
 
 class Client:
     def __init__(self, host, port):
@@ -289,12 +813,23 @@ class Client:
         self.player_id = None
         self.room_id = None
         self.room = None
+        # Принятые снимки по номерам - базы для применения дельт
+        self.snapshot_states = {}
+        self.snapshot_room_id = None
+        self.platforms_data = []
+        self.snapshot_buffer = SnapshotBuffer()
+        self.send_lock = threading.Lock()
+        # Декодированные сообщения от потока приема
+        self.incoming = deque()
+        # До ответа на init сообщения отправляются в JSON
+        self.wire_format = FORMAT_JSON
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Jump Game")
         self.clock = pygame.time.Clock()
         self.running = False
         self.font = pygame.font.Font(None, 36)
         self.big_font = pygame.font.Font(None, 72)
+        self.renderer = Renderer(self.screen, self.font)
         self.input_state = {
             'left': False,
             'right': False,
@@ -303,6 +838,19 @@ class Client:
         }
         self.mouse_x = 0
         self.mouse_y = 0
+        # Предсказание движения своего игрока: номер последнего ввода,
+        # вводы, еще не подтвержденные сервером, и накопленное время шага
+        self.input_seq = 0
+        self.pending_inputs = deque(maxlen=MAX_PENDING_INPUTS)
+        self.prediction_time = 0.0
+        # Длительность шага сервера; уточняется по tick_rate из init
+        self.tick_interval = TICK_INTERVAL
+        # Последний отправленный ввод: повторно шлется только по таймеру
+        self.sent_command = None
+        self.sent_seq = 0
+        self.latency = LatencyTracker()
+        self.next_ping = 0.0
+        self.diagnostics = Diagnostics()
         # Таймеры для показа сообщений
         self.message_timer = 0
         self.message_text = ""
@@ -322,6 +870,8 @@ class Client:
     def connect(self):
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Ввод уходит мелкими кадрами, его нельзя копить до ACK сервера
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.socket.connect((self.host, self.port))
             print(f"[CLIENT] Подключено к серверу {self.host}:{self.port}")
 
@@ -343,25 +893,30 @@ class Client:
                     break
 
                 buffer += data
-
-                while len(buffer) >= 4:
-                    # Читаем заголовок с длиной сообщения
-                    msg_length = int.from_bytes(buffer[:4], byteorder='big')
-                    if len(buffer) < 4 + msg_length:
-                        break  # Не все данные получены
-
-                    # Извлекаем полное сообщение
-                    message_data = buffer[4:4+msg_length]
-                    buffer = buffer[4+msg_length:]
-
-                    message = json.loads(message_data.decode('utf-8'))
-                    self.process_server_message(message)
+                self.diagnostics.count_in(len(data))
+
+                # Сообщения применяются в основном потоке перед отрисовкой,
+                # чтобы не менять объекты комнаты во время рендера
+                frames, buffer = read_frames(buffer)
+                received_at = time.monotonic()
+                for message_data in frames:
+                    started = time.perf_counter()
+                    message = decode_message(message_data)
+                    if message['type'] in ('state', 'delta'):
+                        self.diagnostics.snapshot_received(
+                            received_at, time.perf_counter() - started)
+                    self.incoming.append((received_at, message))
 
             except Exception as e:
                 print(f"[CLIENT] Ошибка при получении данных: {e}")
                 break
 
-    def process_server_message(self, message):
+    def process_incoming(self):
+        while self.incoming:
+            received_at, message = self.incoming.popleft()
+            self.process_server_message(message, received_at)
+
+    def process_server_message(self, message, received_at=None):
         if message['type'] == 'init':
             self.player_id = message['player_id']
             self.room_id = message['room_id']
@@ -370,11 +925,29 @@ class Client:
             self.low_health = False
             self.winner = False
             self.show_end_screen = False
+            # Выбираем формат сообщений из предложенных сервером
+            if WIRE_FORMAT in message.get('formats', []):
+                self.send_message({'type': 'init', 'format': WIRE_FORMAT})
+                self.wire_format = WIRE_FORMAT
+            self.tick_interval = 1 / message.get('tick_rate', TICK_RATE)
+            self.snapshot_buffer.interval = self.tick_interval
             print(
                 f"[CLIENT] Инициализирован как игрок {self.player_id} в комнате {self.room_id}")
-        elif message['type'] == 'state':
-            old_room = self.room
-            self.room = Room.from_dict(message['room'])
+        elif message['type'] in ('state', 'delta'):
+            started = time.perf_counter()
+            room_data = self.apply_snapshot(message, received_at)
+            if room_data is None:
+                return
+            was_in_room = self.room is not None and self.player_id in self.room.players
+            if self.room is None:
+                self.room = Room.from_dict(room_data)
+            else:
+                self.room.apply_dict(room_data)
+            self.reconcile()
+            self.diagnostics.snapshot_applied(time.perf_counter() - started)
+            own = room_data['players'].get(self.player_id)
+            if own is not None:
+                self.latency.snapshot_applied(own['input_seq'], received_at or time.monotonic())
 
             # Проверка выигрыша
             if self.player_id in self.room.players:
@@ -395,12 +968,15 @@ class Client:
                     self.low_health = False
 
             # Проверка если игрок был в комнате, но сейчас его нет (умер или был удален)
-            if old_room and self.player_id in old_room.players and self.player_id not in self.room.players:
+            if was_in_room and self.player_id not in self.room.players:
                 self.dead = True
                 self.show_end_screen = True
                 self.show_message(
                     "ВЫ ПРОИГРАЛИ! Здоровье закончилось", RED, 3000)
 
+        elif message['type'] == 'pong':
+            self.latency.pong(message['t'], received_at or time.monotonic())
+
         elif message['type'] == 'death':
             self.dead = True
             self.show_end_screen = True
@@ -413,17 +989,71 @@ class Client:
             self.low_health = False
             self.winner = False
             self.show_end_screen = False
+            self.pending_inputs.clear()
+            self.latency.clear()
+            # Новый игрок на сервере еще не знает удерживаемого ввода
+            self.sent_command = None
             self.show_message("Перезапуск выполнен!", GREEN, 1000)
 
+    def apply_snapshot(self, message, received_at=None):
+        """Восстанавливает состояние комнаты из полного снимка или дельты и подтверждает его"""
+        if message['type'] == 'state':
+            room_data = message['room']
+            if room_data['id'] != self.snapshot_room_id:
+                # Номера снимков в другой комнате идут своей последовательностью
+                self.snapshot_buffer.clear()
+            self.snapshot_room_id = room_data['id']
+            self.platforms_data = room_data['platforms']
+            state = normalize_state({
+                'players': room_data['players'],
+                'bullets': {bullet['id']: bullet for bullet in room_data['bullets']}
+            })
+            self.snapshot_states = {}
+        else:
+            base = self.snapshot_states.get(message['base'])
+            # Без базового снимка дельту применить нельзя - сервер пришлет
+            # полный снимок, когда подтвержденная база устареет
+            if base is None or message['room_id'] != self.snapshot_room_id:
+                return None
+            state = apply_delta(base, message)
+
+        seq = message['seq']
+        self.snapshot_states[seq] = state
+        for old_seq in [s for s in self.snapshot_states if s <= seq - HISTORY_SIZE]:
+            del self.snapshot_states[old_seq]
+        if received_at is None:
+            received_at = time.monotonic()
+        self.snapshot_buffer.push(seq, received_at, state)
+
+        self.send_message(
+            {'type': 'ack', 'room_id': self.snapshot_room_id, 'seq': seq})
+
+        return {
+            'id': self.snapshot_room_id,
+            'players': state['players'],
+            'bullets': list(state['bullets'].values()),
+            'platforms': self.platforms_data
+        }
+
     def show_message(self, text, color, duration):
         self.message_text = text
         self.message_color = color
         self.message_timer = duration
 
+    def send_message(self, message):
+        # Ввод, ping и подтверждения снимков (apply_snapshot) отправляются
+        # из основного потока: поток приема только складывает сообщения в incoming
+        frame = encode_message(message, self.wire_format)
+        with self.send_lock:
+            self.socket.sendall(frame)
+        self.diagnostics.count_out(len(frame))
+
     def send_input(self):
         if self.socket and self.player_id is not None:
             try:
-                message = {'type': 'input', **self.input_state}
+                sent_at = time.monotonic()
+                message = {'type': 'input', 'seq': self.input_seq,
+                           't': client_time_ms(sent_at), **self.input_state}
 
                 # Добавляем координаты мыши только при выстреле
                 if self.input_state.get('shoot'):
@@ -434,9 +1064,11 @@ class Client:
                     })
 
                 # Отправляем сообщение
-                message_data = json.dumps(message).encode('utf-8')
-                header = len(message_data).to_bytes(4, byteorder='big')
-                self.socket.sendall(header + message_data)
+                self.send_message(message)
+                self.sent_command = {name: message[name]
+                                     for name in ('left', 'right', 'jump')}
+                self.sent_seq = self.input_seq
+                self.latency.input_sent(self.input_seq, sent_at)
 
                 # Сбрасываем состояние выстрела после отправки
                 self.input_state['shoot'] = False
@@ -444,13 +1076,65 @@ class Client:
             except Exception as e:
                 print(f"[CLIENT] Ошибка при отправке ввода: {e}")
 
+    def local_player(self):
+        if self.room is None:
+            return None
+        return self.room.players.get(self.player_id)
+
+    def predict(self, elapsed):
+        """Шаги предсказания с частотой тиков сервера: каждый шаг получает
+        номер и сразу применяется к своему игроку"""
+        interval = self.tick_interval
+        self.prediction_time = min(self.prediction_time + elapsed, interval * 4)
+        while self.prediction_time >= interval:
+            self.prediction_time -= interval
+            self.predict_tick()
+
+    def predict_tick(self):
+        command = {name: self.input_state[name]
+                   for name in ('left', 'right', 'jump')}
+        self.input_seq += 1
+        # Сервер удерживает последний ввод сам, поэтому отправляем только
+        # изменения, выстрелы и редкий повтор, сверяющий номера шагов
+        if (command != self.sent_command or self.input_state['shoot'] or
+                self.input_seq - self.sent_seq >= INPUT_HEARTBEAT_TICKS):
+            self.send_input()
+
+        player = self.local_player()
+        if player is not None:
+            player.apply_input(command)
+            player.step(self.room.platforms)
+        self.pending_inputs.append((self.input_seq, command))
+
+    def reconcile(self):
+        """Берет состояние своего игрока от сервера и повторяет поверх него
+        вводы, которые сервер еще не применил"""
+        player = self.local_player()
+        if player is None:
+            self.pending_inputs.clear()
+            return
+        while self.pending_inputs and self.pending_inputs[0][0] <= player.input_seq:
+            self.pending_inputs.popleft()
+        for _, command in self.pending_inputs:
+            player.apply_input(command)
+            player.step(self.room.platforms)
+
+    def measure_latency(self):
+        now = time.monotonic()
+        if self.player_id is None:
+            return
+        if now >= self.next_ping:
+            self.next_ping = now + PING_INTERVAL
+            try:
+                self.send_message({'type': 'ping', 't': client_time_ms(now)})
+            except Exception as e:
+                print(f"[CLIENT] Ошибка при отправке ping: {e}")
+        self.latency.report(now)
+
     def send_restart_request(self):
         if self.socket and self.player_id is not None:
             try:
-                message = {'type': 'restart'}
-                message_data = json.dumps(message).encode('utf-8')
-                header = len(message_data).to_bytes(4, byteorder='big')
-                self.socket.sendall(header + message_data)
+                self.send_message({'type': 'restart'})
                 print(f"[CLIENT] Запрос на перезапуск отправлен")
             except Exception as e:
                 print(
@@ -466,6 +1150,9 @@ class Client:
             for event in pygame.event.get():
                 if event.type == QUIT:
                     self.running = False
+                elif event.type == WINDOWEXPOSED:
+                    # Окно было перекрыто - экран нужно вывести заново
+                    self.renderer.invalidate()
                 elif event.type == KEYDOWN:
                     # Движение влево на A
                     if event.key == K_a:
@@ -479,6 +1166,9 @@ class Client:
                     # Выстрел на LCTRL
                     elif event.key == K_LCTRL:
                         self.input_state['shoot'] = True
+                    # Панель диагностики на F3
+                    elif event.key == K_F3:
+                        self.diagnostics.toggle()
                 elif event.type == KEYUP:
                     if event.key == K_a:
                         self.input_state['left'] = False
@@ -494,6 +1184,8 @@ class Client:
                         self.input_state['shoot'] = True
                         self.mouse_x, self.mouse_y = event.pos
 
+            self.process_incoming()
+
             # Обновление кнопки перезапуска
             self.restart_button.update(mouse_pos)
 
@@ -502,10 +1194,14 @@ class Client:
                 self.send_restart_request()
 
             # Только отправляем ввод если игрок жив и не победил
-            if not self.show_end_screen:
-                self.send_input()
+            if not self.show_end_screen and self.player_id is not None:
+                self.predict(self.clock.get_time() / 1000)
 
+            started = time.perf_counter()
             self.render()
+            self.diagnostics.frame_rendered(time.perf_counter() - started)
+            self.diagnostics.update(time.monotonic())
+            self.measure_latency()
 
             # Обновляем таймер сообщения
             if self.message_timer > 0:
@@ -516,124 +1212,107 @@ class Client:
         pygame.quit()
 
     def draw_message_box(self, text, color, size="normal"):
-        # Создаем полупрозрачный фон
-        overlay = pygame.Surface(
-            (SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))  # RGBA: черный с 70% прозрачности
-        self.screen.blit(overlay, (0, 0))
+        # Затемняем экран под сообщением
+        self.renderer.shade_screen()
 
         # Выбираем шрифт в зависимости от размера сообщения
         font = self.big_font if size == "big" else self.font
 
-        # Рисуем текст
-        text_surface = font.render(text, True, color)
-        text_rect = text_surface.get_rect(
-            center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2))
-
-        # Добавляем рамку вокруг сообщения
-        padding = 20
-        box_rect = pygame.Rect(text_rect.left - padding, text_rect.top - padding,
-                               text_rect.width + padding*2, text_rect.height + padding*2)
-        pygame.draw.rect(self.screen, (50, 50, 50), box_rect)
-        pygame.draw.rect(self.screen, color, box_rect, 3)
-
-        # Добавляем текст
-        self.screen.blit(text_surface, text_rect)
+        box = self.renderer.message_box(text, color, font)
+        self.renderer.blit(box, box.get_rect(
+            center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2)))
 
     def render(self):
         if not self.room:
             self.screen.fill(BLACK)
-            waiting_text = self.font.render(
-                "Ожидание данных от сервера...", True, WHITE)
+            waiting_text = texts.render(
+                self.font, "Ожидание данных от сервера...", WHITE)
             self.screen.blit(waiting_text, (SCREEN_WIDTH//2 -
                              waiting_text.get_width()//2, SCREEN_HEIGHT//2))
+            pygame.display.flip()
+            self.renderer.invalidate()
+            return
+
+        renderer = self.renderer
+        # Фон, платформы и финишная линия берутся из статичного слоя
+        renderer.set_level(self.room)
+        renderer.begin_frame()
+
+        # Пули и чужие игроки - в интерполированном прошлом, свой игрок -
+        # в предсказанном настоящем
+        positions = self.snapshot_buffer.sample(time.monotonic())
+        if positions is None:
+            for bullet in self.room.bullets.values():
+                renderer.blit(bullet.image, (bullet.x, bullet.y))
         else:
-            # Рисуем игровой мир
-            self.screen.blit(self.room.background, (0, 0))
-
-            for platform in self.room.platforms:
-                platform.draw(self.screen)
-            for bullet in self.room.bullets:
-                self.screen.blit(bullet.image, (bullet.x, bullet.y))
-
-            # Рисуем игроков
-            for player_id, player in self.room.players.items():
-                self.screen.blit(player.image, (player.x, player.y))
-
-                # Здоровье
-                health_color = GREEN
-                if player.health < 70:
-                    health_color = YELLOW
-                if player.health < 30:
-                    health_color = RED
-
-                health_text = self.font.render(
-                    f"{player.health}", True, health_color)
-                self.screen.blit(health_text, (player.x, player.y - 20))
-
-                # Выделяем текущего игрока
-                if player_id == self.player_id:
-                    pygame.draw.rect(self.screen, GREEN, player.rect, 2)
-
-            # Рисуем очки
-            y_offset = 10
-            for player_id, player in self.room.players.items():
-                player_color = GREEN if player_id == self.player_id else WHITE
-                score_text = self.font.render(
-                    f"Игрок {player_id}: {player.score}/{WIN_SCORE}", True, player_color)
-                self.screen.blit(score_text, (10, y_offset))
-                y_offset += 30
-
-            # Финишная линия
-            pygame.draw.rect(self.screen, RED, (0, 0, SCREEN_WIDTH, 10))
-            finish_text = self.font.render("ФИНИШ", True, WHITE)
-            self.screen.blit(finish_text, (SCREEN_WIDTH//2 -
-                                           finish_text.get_width()//2, 10))
-
-            # Отображаем текущее сообщение, если оно есть
-            if self.message_timer > 0:
-                self.draw_message_box(
-                    self.message_text, self.message_color, "big")
-
-            # Если игрок погиб или победил, показываем соответствующее сообщение
-            if self.show_end_screen:
-                # Создаем полупрозрачный фон
-                overlay = pygame.Surface(
-                    (SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-                overlay.fill((0, 0, 0, 180))  # RGBA: черный с 70% прозрачности
-                self.screen.blit(overlay, (0, 0))
-
-                # Рисуем сообщение
-                message_text = "ПОЗДРАВЛЯЕМ! ВЫ ПОБЕДИЛИ!" if self.winner else "ВЫ ПРОИГРАЛИ!"
-                message_color = GREEN if self.winner else RED
-
-                text_surface = self.big_font.render(
-                    message_text, True, message_color)
-                text_rect = text_surface.get_rect(
-                    center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 50))
-
-                # Рамка сообщения
-                padding = 20
-                box_rect = pygame.Rect(text_rect.left - padding, text_rect.top - padding,
-                                       text_rect.width + padding*2, text_rect.height + padding*2)
-                pygame.draw.rect(self.screen, (50, 50, 50), box_rect)
-                pygame.draw.rect(self.screen, message_color, box_rect, 3)
-
-                # Отображаем текст
-                self.screen.blit(text_surface, text_rect)
-
-                # Отображаем описание
-                description = "Наберите " + \
-                    str(WIN_SCORE) + " очков для победы!"
-                desc_surface = self.font.render(description, True, WHITE)
-                desc_rect = desc_surface.get_rect(
-                    center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 20))
-                self.screen.blit(desc_surface, desc_rect)
-
-                # Рисуем кнопку перезапуска
-                self.restart_button.draw(self.screen)
-
-        pygame.display.flip()
+            bullet_image = sprites.get("bullet")
+            for (kind, _), position in positions.items():
+                if kind == 'bullets':
+                    renderer.blit(bullet_image, position)
+
+        # Рисуем игроков
+        for player_id, player in self.room.players.items():
+            x, y = player.x, player.y
+            if positions is not None and player_id != self.player_id:
+                x, y = positions.get(('players', player_id), (x, y))
+            renderer.blit(player.image, (x, y))
+
+            # Здоровье
+            health_color = GREEN
+            if player.health < 70:
+                health_color = YELLOW
+            if player.health < 30:
+                health_color = RED
+
+            health_text = texts.render(
+                self.font, f"{player.health}", health_color)
+            renderer.blit(health_text, (x, y - 20))
+
+            # Выделяем текущего игрока
+            if player_id == self.player_id:
+                renderer.draw_rect(GREEN, player.rect, 2)
+
+        # Рисуем очки
+        y_offset = 10
+        for player_id, player in self.room.players.items():
+            player_color = GREEN if player_id == self.player_id else WHITE
+            score_text = texts.render(
+                self.font, f"Игрок {player_id}: {player.score}/{WIN_SCORE}", player_color)
+            renderer.blit(score_text, (10, y_offset))
+            y_offset += 30
+
+        # Отображаем текущее сообщение, если оно есть
+        if self.message_timer > 0:
+            self.draw_message_box(
+                self.message_text, self.message_color, "big")
+
+        # Если игрок погиб или победил, показываем соответствующее сообщение
+        if self.show_end_screen:
+            renderer.shade_screen()
+
+            # Рисуем сообщение в рамке
+            message_text = "ПОЗДРАВЛЯЕМ! ВЫ ПОБЕДИЛИ!" if self.winner else "ВЫ ПРОИГРАЛИ!"
+            message_color = GREEN if self.winner else RED
+            box = renderer.message_box(message_text, message_color, self.big_font)
+            renderer.blit(box, box.get_rect(
+                center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 50)))
+
+            # Отображаем описание
+            description = "Наберите " + \
+                str(WIN_SCORE) + " очков для победы!"
+            desc_surface = texts.render(self.font, description, WHITE)
+            renderer.blit(desc_surface, desc_surface.get_rect(
+                center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 20)))
+
+            # Рисуем кнопку перезапуска
+            self.restart_button.draw(self.screen)
+
+        if self.diagnostics.visible:
+            panel = self.diagnostics.surface(time.monotonic(), self.latency)
+            renderer.blit(panel, (SCREEN_WIDTH - panel.get_width() - 10, 40))
+
+        renderer.end_frame()
+        self.latency.frame_shown(time.monotonic())
 
     def cleanup(self):
         if self.socket:
@@ -0,0 +1,104 @@
+"""Исходящая очередь соединения с неблокирующей записью в сокет"""
+import socket
+import threading
+from collections import deque
+
+# Сколько снимков может ждать отправки медленному клиенту; при переполнении
+# выбрасывается самый старый - более новый снимок все равно его заменяет
+MAX_QUEUED_SNAPSHOTS = 3
+# Предел всей очереди в байтах: полные снимки и события не выбрасываются,
+# и клиент, который их не принимает, отключается, а не копит память сервера
+MAX_QUEUED_BYTES = 512 * 1024
+
+
+class QueueOverflowError(ConnectionError):
+    """Очередь соединения превысила предел; соединение закрыто"""
+
+
+class Connection:
+    def __init__(self, client_socket, max_snapshots=MAX_QUEUED_SNAPSHOTS,
+                 max_bytes=MAX_QUEUED_BYTES):
+        self.socket = client_socket
+        self.socket.setblocking(False)
+        # Вводы, подтверждения и pong - мелкие кадры: без TCP_NODELAY алгоритм
+        # Нейгла вместе с отложенным ACK задерживает их на десятки миллисекунд
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.max_snapshots = max_snapshots
+        self.max_bytes = max_bytes
+        # Очередь готовых кадров: (bytes, можно ли выбросить)
+        self.queue = deque()
+        self.queued_snapshots = 0
+        self.queued_bytes = 0
+        # Очередь переполнилась: новые кадры больше не принимаются
+        self.closed = False
+        # Недописанный остаток кадра, который уже начали отправлять
+        self.pending = None
+        self.dropped_snapshots = 0
+        self.lock = threading.Lock()
+
+    def enqueue(self, frame, droppable=False):
+        """Ставит готовый кадр в очередь и сразу пытается его отправить.
+
+        droppable=True помечает снимки состояния, которые можно выбросить,
+        если клиент не успевает их принимать. Если очередь все равно
+        превышает max_bytes, соединение закрывается на чтение и запись:
+        цикл приема увидит конец потока и отключит клиента обычным путем.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            if droppable:
+                if self.queued_snapshots >= self.max_snapshots:
+                    self._drop_oldest_snapshot()
+                self.queued_snapshots += 1
+            self.queue.append((frame, droppable))
+            self.queued_bytes += len(frame)
+            self._flush()
+            if self.queued_bytes > self.max_bytes:
+                self._close()
+                raise QueueOverflowError(
+                    f"очередь отправки превысила {self.max_bytes} байт, клиент отключается")
+
+    def _drop_oldest_snapshot(self):
+        for item in self.queue:
+            if item[1]:
+                self.queue.remove(item)
+                self.queued_snapshots -= 1
+                self.queued_bytes -= len(item[0])
+                self.dropped_snapshots += 1
+                return
+
+    def _close(self):
+        self.closed = True
+        self.queue.clear()
+        self.queued_snapshots = 0
+        self.queued_bytes = 0
+        self.pending = None
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def flush(self):
+        """Отправляет столько, сколько примет сокет, не блокируясь"""
+        with self.lock:
+            return self._flush()
+
+    def _flush(self):
+        while self.pending is not None or self.queue:
+            if self.pending is None:
+                frame, droppable = self.queue.popleft()
+                self.queued_bytes -= len(frame)
+                if droppable:
+                    self.queued_snapshots -= 1
+                self.pending = memoryview(frame)
+            try:
+                sent = self.socket.send(self.pending)
+            except (BlockingIOError, InterruptedError):
+                return True
+            self.pending = self.pending[sent:] if sent < len(self.pending) else None
+        return False
+
+    def has_pending(self):
+        with self.lock:
+            return self.pending is not None or bool(self.queue)
@@ -0,0 +1,701 @@
+"""Безголовое ядро симуляции: игроки, пули, платформы и комнаты.
+
+Не зависит от pygame и SDL, поэтому серверные процессы стартуют быстро
+и не тянут за собой графические и звуковые библиотеки.
+"""
+import random
+from collections import deque
+
+from snapshot import SnapshotHistory
+from spatial import SpatialHash
+from bullets import BulletPool
+
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+PLAYER_SIZE = 32
+BULLET_SIZE = 8
+GRAVITY = 0.5
+JUMP_FORCE = -10
+MOVEMENT_SPEED = 5
+BULLET_SPEED = 10
+PLATFORM_HEIGHT = 20
+MAX_PLAYERS = 4
+WIN_SCORE = 5
+# Параметры прыжка
+JUMP_HEIGHT = JUMP_FORCE**2 / (2 * GRAVITY)
+JUMP_TIME = 2 * abs(JUMP_FORCE) / GRAVITY
+MAX_HORIZONTAL = MOVEMENT_SPEED * JUMP_TIME
+# Высота верхних платформ уровня
+TOP_TARGET_Y = 20
+# Запас к пределам прыжка при проверке достижимости
+REACH_MARGIN = 0.9
+# Сколько раз уровень пересобирается, если верх недостижим
+LEVEL_ATTEMPTS = 10
+# Сколько мест пробуется для очередной платформы пути
+PLACEMENT_ATTEMPTS = 8
+# Ячейка индекса при генерации - порядка дальности прыжка, чтобы запрос
+# соседей по прыжку задевал всего несколько ячеек
+LEVEL_CELL_SIZE = int(MAX_HORIZONTAL)
+# Сколько сообщений ввода игрока может ждать следующего тика
+MAX_QUEUED_INPUTS = 32
+
+
+def _round_coord(value):
+    # pygame.Rect при присваивании округляет дробные координаты от нуля
+    return int(value + 0.5) if value >= 0 else int(value - 0.5)
+
+
+class Rect:
+    """Легковесная замена pygame.Rect с тем же поведением для нужных полей"""
+    __slots__ = ('_x', '_y', 'width', 'height')
+
+    def __init__(self, x, y, width, height):
+        # Конструктор pygame.Rect отбрасывает дробную часть
+        self._x = int(x)
+        self._y = int(y)
+        self.width = int(width)
+        self.height = int(height)
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        self._x = _round_coord(value)
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, value):
+        self._y = _round_coord(value)
+
+    left = x
+    top = y
+
+    @property
+    def right(self):
+        return self._x + self.width
+
+    @property
+    def bottom(self):
+        return self._y + self.height
+
+    @bottom.setter
+    def bottom(self, value):
+        self._y = _round_coord(value) - self.height
+
+    def colliderect(self, other):
+        return (self._x < other.right and self.right > other.left and
+                self._y < other.bottom and self.bottom > other.top)
+
+
+class Player:
+    __slots__ = ('id', 'x', 'y', 'vel_x', 'vel_y', 'is_jumping',
+                 'health', 'score', 'input_seq', 'command', 'inputs', 'rect')
+
+    def __init__(self, player_id, x, y):
+        self.id = player_id
+        self.x = x
+        self.y = y
+        self.vel_x = 0
+        self.vel_y = 0
+        self.is_jumping = False
+        self.health = 100
+        self.score = 0
+        # Номер последнего примененного ввода - по нему клиент сверяет предсказание
+        self.input_seq = 0
+        # Последний полученный ввод удерживается, пока клиент не пришлет новый;
+        # сообщения копятся в очереди и применяются на границе тика
+        self.command = None
+        self.inputs = deque(maxlen=MAX_QUEUED_INPUTS)
+        self.rect = Rect(x, y, PLAYER_SIZE, PLAYER_SIZE)
+
+    def queue_input(self, message):
+        self.inputs.append(message)
+
+    def take_inputs(self):
+        """Забирает из очереди вводы, относящиеся к следующему шагу.
+
+        Номер ввода - номер шага клиента. Опоздавшие вводы и ввод текущего
+        шага забираются вместе; вводы следующих шагов остаются в очереди до
+        своих тиков, чтобы за один шаг физики не засчитать несколько шагов
+        клиента. Если клиент опередил счет сервера, берется один его ввод.
+        """
+        due = self.input_seq + 1
+        messages = []
+        while self.inputs:
+            seq = self.inputs[0].get('seq', due)
+            if seq > due:
+                if messages:
+                    break
+                due = seq
+            messages.append(self.inputs.popleft())
+        return messages
+
+    def apply_inputs(self, bullets, messages):
+        """Применяет вводы одного шага по порядку номеров.
+
+        Клиент присылает ввод только при изменении и раз в полсекунды, а номер
+        ввода - это номер его шага. Тик без новых сообщений соответствует
+        следующему шагу клиента с тем же удерживаемым вводом. Номер
+        примененного ввода не убывает: опоздавший ввод меняет удерживаемую
+        команду, но шаг, на котором он применен, уже следующий.
+        """
+        if messages:
+            seq = self.input_seq + 1
+            for message in messages:
+                seq = max(seq, message.get('seq', seq))
+                self.command = message
+                self.apply_command(message)
+                if message.get('shoot'):
+                    self.fire(bullets, message.get('mouse_x', self.x),
+                              message.get('mouse_y', self.y - 100))
+            self.input_seq = seq
+        elif self.command is not None:
+            self.input_seq += 1
+            self.apply_command(self.command)
+
+    def apply_command(self, command):
+        if command.get('left'):
+            self.move_left()
+        elif command.get('right'):
+            self.move_right()
+        else:
+            self.stop()
+
+        if command.get('jump'):
+            self.jump()
+
+    def fire(self, bullets, target_x, target_y):
+        # Вычисляем направление
+        start_x = self.x + PLAYER_SIZE//2
+        start_y = self.y + PLAYER_SIZE//2
+        dx = target_x - start_x
+        dy = target_y - start_y
+        distance = max(1, (dx**2 + dy**2)**0.5)
+
+        # Нормализуем и задаем скорость
+        bullets.spawn(self.id, start_x, start_y,
+                      (dx / distance) * BULLET_SPEED, (dy / distance) * BULLET_SPEED)
+
+    def update(self, platform_index, rng=random):
+        self.vel_y += GRAVITY
+        self.x += self.vel_x
+        self.y += self.vel_y
+
+        if self.x < 0:
+            self.x = 0
+        if self.x > SCREEN_WIDTH - PLAYER_SIZE:
+            self.x = SCREEN_WIDTH - PLAYER_SIZE
+
+        self.rect.x = self.x
+        self.rect.y = self.y
+
+        on_ground = False
+        # Проверяем только платформы из ячеек сетки, которые задевает игрок
+        for platform in platform_index.query(self.rect):
+            if (self.rect.bottom >= platform.rect.top and
+                self.rect.bottom <= platform.rect.top + 10 and
+                self.rect.right > platform.rect.left and
+                self.rect.left < platform.rect.right and
+                    self.vel_y > 0):
+                self.rect.bottom = platform.rect.top
+                self.y = self.rect.y
+                self.vel_y = 0
+                on_ground = True
+
+        self.is_jumping = not on_ground
+
+        if self.y > SCREEN_HEIGHT:
+            self.x = rng.randint(50, SCREEN_WIDTH - 50)
+            self.y = 0
+            self.vel_y = 0
+            self.health -= 25
+
+        if self.y < 10 and self.y > 0:
+            self.score += 1
+            self.x = rng.randint(50, SCREEN_WIDTH - 50)
+            self.y = SCREEN_HEIGHT - 100
+            self.vel_y = 0
+
+    def jump(self):
+        if not self.is_jumping:
+            self.vel_y = JUMP_FORCE
+            self.is_jumping = True
+
+    def move_left(self):
+        self.vel_x = -MOVEMENT_SPEED
+
+    def move_right(self):
+        self.vel_x = MOVEMENT_SPEED
+
+    def stop(self):
+        self.vel_x = 0
+
+    def shoot(self):
+        bullet = Bullet(self.id, self.x + PLAYER_SIZE //
+                        2, self.y + PLAYER_SIZE//2)
+        return bullet
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'x': self.x,
+            'y': self.y,
+            'vel_x': self.vel_x,
+            'vel_y': self.vel_y,
+            'health': self.health,
+            'score': self.score,
+            'is_jumping': self.is_jumping,
+            'input_seq': self.input_seq
+        }
+
+    @staticmethod
+    def from_dict(data):
+        player = Player(data['id'], data['x'], data['y'])
+        player.vel_x = data['vel_x']
+        player.vel_y = data['vel_y']
+        player.health = data['health']
+        player.score = data['score']
+        player.is_jumping = bool(data.get('is_jumping', False))
+        player.input_seq = data.get('input_seq', 0)
+        return player
+
+
+class Bullet:
+    __slots__ = ('id', 'owner_id', 'x', 'y', 'vel_x', 'vel_y', 'rect')
+
+    def __init__(self, owner_id, x, y, bullet_id=0):
+        self.id = bullet_id
+        self.owner_id = owner_id
+        self.x = x
+        self.y = y
+        self.vel_x = 0
+        self.vel_y = -BULLET_SPEED
+        self.rect = Rect(x, y, BULLET_SIZE, BULLET_SIZE)
+
+    def update(self):
+        self.x += self.vel_x
+        self.y += self.vel_y
+        self.rect.x = self.x
+        self.rect.y = self.y
+
+        if (self.x < 0 or self.x > SCREEN_WIDTH or
+                self.y < 0 or self.y > SCREEN_HEIGHT):
+            return False
+        return True
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'owner_id': self.owner_id,
+            'x': self.x,
+            'y': self.y,
+            'vel_x': self.vel_x,
+            'vel_y': self.vel_y
+        }
+
+    @staticmethod
+    def from_dict(data):
+        bullet = Bullet(data['owner_id'], data['x'], data['y'], data.get('id', 0))
+        bullet.vel_x = data['vel_x']
+        bullet.vel_y = data['vel_y']
+        return bullet
+
+
+class Platform:
+    __slots__ = ('x', 'y', 'width', 'height', 'rect')
+
+    def __init__(self, x, y, width):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = PLATFORM_HEIGHT
+        self.rect = Rect(x, y, width, self.height)
+
+    def to_dict(self):
+        return {
+            'x': self.x,
+            'y': self.y,
+            'width': self.width
+        }
+
+    @staticmethod
+    def from_dict(data):
+        return Platform(data['x'], data['y'], data['width'])
+
+
+def jump_reach(rise):
+    """Горизонтальная дальность прыжка на платформу выше на rise
+    (ниже - при отрицательном rise) или None, если она недостижима"""
+    discriminant = JUMP_FORCE**2 - 2 * GRAVITY * rise
+    if discriminant < 0:
+        return None
+    airtime = (abs(JUMP_FORCE) + discriminant**0.5) / GRAVITY
+    return MOVEMENT_SPEED * airtime
+
+
+def horizontal_gap(a_x, a_width, b_x, b_width):
+    return max(0, b_x - (a_x + a_width), a_x - (b_x + b_width))
+
+
+def reachable_from(platform, platform_index):
+    """Ребра графа прыжков: платформы, на которые можно попасть с platform.
+
+    Снизу вверх платформы проходимы, поэтому важны только высота подъема и
+    дальность полета. Спуск ограничен высотой прыжка: при более долгом
+    падении скорость за тик больше толщины зоны приземления.
+    """
+    max_rise = JUMP_HEIGHT * REACH_MARGIN
+    area = Rect(platform.x - MAX_HORIZONTAL, platform.y - max_rise,
+                platform.width + 2 * MAX_HORIZONTAL, max_rise + JUMP_HEIGHT)
+    for other in platform_index.query(area):
+        if other is platform:
+            continue
+        rise = platform.y - other.y
+        if rise > max_rise or rise < -JUMP_HEIGHT:
+            continue
+        gap = horizontal_gap(platform.x, platform.width, other.x, other.width)
+        if gap <= jump_reach(rise) * REACH_MARGIN:
+            yield other
+
+
+def top_reachable(platforms, platform_index=None, top_y=TOP_TARGET_Y):
+    """Обход в ширину от земли (первая платформа): O(вершин + ребер)"""
+    if platform_index is None:
+        platform_index = SpatialHash(LEVEL_CELL_SIZE)
+        for platform in platforms:
+            platform_index.insert(platform, platform.rect)
+    visited = {id(platforms[0])}
+    queue = deque([platforms[0]])
+    while queue:
+        platform = queue.popleft()
+        if platform.y <= top_y:
+            return True
+        for other in reachable_from(platform, platform_index):
+            if id(other) not in visited:
+                visited.add(id(other))
+                queue.append(other)
+    return False
+
+
+class LevelBuilder:
+    """Раскладка платформ с индексом занятых мест вместо сетки и перебора"""
+
+    def __init__(self, rng=random):
+        self.rng = rng
+        # Минимальная высота между платформами (половина высоты прыжка)
+        self.min_vertical_distance = JUMP_HEIGHT * 0.5
+        self.platforms = [Platform(0, SCREEN_HEIGHT - 20, SCREEN_WIDTH)]
+        # Землю не индексируем: к ней близость не проверяется
+        self.index = SpatialHash(LEVEL_CELL_SIZE)
+        # Хотя бы один путь дошел до верха: каждый его шаг в пределах прыжка,
+        # так что уровень проходим и без обхода графа
+        self.reached_top = False
+
+    def too_close(self, x, y, width):
+        distance = self.min_vertical_distance
+        area = Rect(x, y - distance, width, 2 * distance)
+        for platform in self.index.query(area):
+            if (abs(platform.y - y) < distance and
+                    x < platform.x + platform.width and x + width > platform.x):
+                return True
+        return False
+
+    def place(self, x, y, width):
+        if self.too_close(x, y, width):
+            return None
+        platform = Platform(x, y, width)
+        self.platforms.append(platform)
+        self.index.insert(platform, Rect(x, y, width, PLATFORM_HEIGHT))
+        return platform
+
+    def place_near(self, previous, target_x, y, width):
+        """Ставит платформу как можно ближе к target_x, но в пределах прыжка с previous"""
+        reach = jump_reach(previous.y - y) * 0.85
+        low = max(10, previous.x - width - reach)
+        high = min(SCREEN_WIDTH - width - 10, previous.x + previous.width + reach)
+        if low > high:
+            return None
+        return self.place(max(low, min(target_x, high)), y, width)
+
+    def build_path(self, path_index, start_x):
+        max_rise = JUMP_HEIGHT * 0.8
+        max_shift = MAX_HORIZONTAL * 0.85
+        previous = self.platforms[0]
+        current_x = start_x
+
+        # Поднимаемся, пока верх не окажется в пределах одного прыжка
+        while previous.y - TOP_TARGET_Y > max_rise:
+            platform = None
+            for _ in range(PLACEMENT_ATTEMPTS):
+                width = self.rng.randint(80, 150)
+                y = self.next_height(previous.y, max_rise)
+                platform = self.place_near(previous, current_x, y, width)
+                if platform:
+                    break
+            if platform is None:
+                return  # Путь уперся в соседние - проходимость проверит граф
+
+            previous = platform
+            # В зависимости от номера пути, смещаем платформы в разных направлениях
+            if path_index % 2 == 0:
+                current_x = platform.x + self.rng.uniform(-max_shift, max_shift/2)
+            else:
+                current_x = platform.x + self.rng.uniform(-max_shift/2, max_shift)
+
+        # Финальная "верхняя" платформа, чуть шире для надежности
+        final_width = self.rng.randint(100, 180)
+        final_x = previous.x + self.rng.uniform(-MAX_HORIZONTAL*0.5, MAX_HORIZONTAL*0.5)
+        if self.place_near(previous, final_x, TOP_TARGET_Y, final_width):
+            self.reached_top = True
+
+    def next_height(self, previous_y, max_rise):
+        """Высота следующей платформы пути.
+
+        Ниже верха на (max_rise, 2 * min_vertical_distance) тупик: до верха
+        не допрыгнуть, а промежуточная платформа оказалась бы ближе
+        min_vertical_distance и к этой, и к верхней. Такую высоту сдвигаем
+        на край промежутка, до которого хватает подъема.
+        """
+        distance = self.min_vertical_distance
+        y = previous_y - self.rng.uniform(distance, max_rise)
+        if TOP_TARGET_Y + max_rise < y < TOP_TARGET_Y + 2 * distance:
+            if previous_y - (TOP_TARGET_Y + max_rise) <= max_rise:
+                y = TOP_TARGET_Y + max_rise
+            else:
+                y = TOP_TARGET_Y + 2 * distance
+        return max(y, TOP_TARGET_Y + distance)
+
+    def add_connectors(self):
+        """Несколько соединительных платформ между путями"""
+        for _ in range(self.rng.randint(2, 4)):
+            plat1, plat2 = self.rng.sample(self.platforms[1:], 2)
+            dy = abs(plat1.y - plat2.y)
+            if not 2 * self.min_vertical_distance <= dy < JUMP_HEIGHT * 1.5:
+                continue
+            self.place((plat1.x + plat2.x) / 2, (plat1.y + plat2.y) / 2,
+                       self.rng.randint(70, 120))
+
+    def build(self):
+        # Создаем несколько "путей" наверх
+        num_paths = self.rng.randint(2, 3)
+        path_starting_points = sorted(self.rng.randint(
+            100, SCREEN_WIDTH - 300) for _ in range(num_paths))
+
+        # Обеспечиваем минимальное расстояние между путями
+        min_path_distance = 150
+        for i in range(1, len(path_starting_points)):
+            if path_starting_points[i] - path_starting_points[i-1] < min_path_distance:
+                path_starting_points[i] = min(path_starting_points[i-1] + min_path_distance,
+                                              SCREEN_WIDTH - 150)
+
+        for path_index, start_x in enumerate(path_starting_points):
+            self.build_path(path_index, start_x)
+        if len(self.platforms) > 5:
+            self.add_connectors()
+        return self.platforms
+
+
+def generate_level(rng=random):
+    """Собирает уровень, пока граф прыжков не приведет с земли к верху"""
+    for _ in range(LEVEL_ATTEMPTS):
+        builder = LevelBuilder(rng)
+        platforms = builder.build()
+        # Индекс раскладки годится и для обхода: земля - только начало пути
+        if builder.reached_top or top_reachable(platforms, builder.index):
+            return platforms
+    print("[SERVER] Не удалось собрать проходимый уровень")
+    return platforms
+
+
+class Room:
+    __slots__ = ('id', 'players', 'bullets', 'platforms', 'platform_index',
+                 'clients', 'history', 'seed', 'rng', 'tick', 'recorder')
+
+    def __init__(self, room_id, platforms=None, seed=None):
+        self.id = room_id
+        self.players = {}
+        self.bullets = BulletPool(BULLET_SIZE, SCREEN_WIDTH, SCREEN_HEIGHT)
+        # Все случайные решения комнаты идут от ее зерна, поэтому матч
+        # воспроизводится по зерну, уровню и журналу вводов (см. replay.py)
+        self.seed = random.getrandbits(32) if seed is None else seed
+        # Готовый уровень обычно берется из пула, см. levels.LevelPool
+        if platforms is None:
+            platforms = self.generate_platforms()
+        self.platforms = platforms
+        self.index_platforms()
+        self.rng = random.Random(self.seed)
+        self.tick = 0
+        self.recorder = None
+        self.clients = {}  # Добавлено для хранения связи игроков с их сокетами
+        # История снимков для дельта-кодирования состояния
+        self.history = SnapshotHistory()
+
+    def index_platforms(self):
+        # Платформы после генерации не двигаются - индексируем их один раз
+        self.platform_index = SpatialHash()
+        for platform in self.platforms:
+            self.platform_index.insert(platform, platform.rect)
+
+    def generate_platforms(self):
+        return generate_level(random.Random(self.seed))
+
+    def record(self, player_id, message):
+        if self.recorder is not None:
+            self.recorder.record(self.tick, player_id, message)
+
+    def spawn_point(self):
+        return self.rng.randint(50, SCREEN_WIDTH - 50), SCREEN_HEIGHT - 100
+
+    def add_player(self, player_id, player=None):
+        """Добавляет игрока: нового в случайной точке или перешедшего из другой комнаты"""
+        if player is None:
+            x, y = self.spawn_point()
+            player = Player(player_id, x, y)
+            self.record(player_id, {'type': 'join'})
+        else:
+            self.record(player_id, {'type': 'join', 'player': player.to_dict(),
+                                    'command': player.command})
+        self.players[player_id] = player
+        return player
+
+    def remove_player(self, player_id):
+        player = self.players.pop(player_id, None)
+        self.clients.pop(player_id, None)
+        self.record(player_id, {'type': 'leave'})
+        return player
+
+    def restart_player(self, player_id):
+        """Возвращает погибшего игрока или сбрасывает состояние живого.
+        True, если игрок был создан заново"""
+        self.record(player_id, {'type': 'restart'})
+        player = self.players.get(player_id)
+        # Если игрок не существует или был удален при смерти
+        if player is None:
+            x, y = self.spawn_point()
+            self.players[player_id] = Player(player_id, x, y)
+            return True
+
+        # Если игрок существует, но выиграл или имеет низкое здоровье
+        player.health = 100
+        player.score = 0
+        player.x, player.y = self.spawn_point()
+        player.vel_x = 0
+        player.vel_y = 0
+        return False
+
+    def update(self, server):
+        # Проверка на победу
+        for player_id, player in list(self.players.items()):
+            if player.score >= WIN_SCORE:
+                # Отправляем сообщение всем игрокам о победителе
+                winner_message = {
+                    'type': 'winner',
+                    'player_id': player_id
+                }
+                self.broadcast_message(server, winner_message)
+
+        # Обновление игроков
+        for player_id, player in list(self.players.items()):
+            old_health = player.health
+            messages = player.take_inputs()
+            for message in messages:
+                self.record(player_id, message)
+            player.apply_inputs(self.bullets, messages)
+            player.update(self.platform_index, self.rng)
+
+            # Проверка низкого здоровья
+            if old_health > 30 and player.health <= 30:
+                # Отправляем предупреждение о низком здоровье
+                low_health_message = {
+                    'type': 'low_health',
+                    'player_id': player_id
+                }
+                server.send_to_player(player_id, low_health_message)
+
+            # Проверка на смерть
+            if player.health <= 0:
+                # Отправляем сообщение о смерти
+                death_message = {
+                    'type': 'death',
+                    'player_id': player_id
+                }
+                server.send_to_player(player_id, death_message)
+
+                # Удаляем игрока из комнаты
+                del self.players[player_id]
+
+        # Обновление пуль (векторно) и обработка попаданий
+        self.bullets.step()
+        for player_id, player in list(self.players.items()):
+            hit_slots = self.bullets.hits(player.rect, player_id)
+            for owner_id in self.bullets.owner[hit_slots].tolist():
+                player.health -= 10
+
+                # Если здоровье игрока стало критическим после попадания
+                if player.health <= 30 and player.health > 0:
+                    low_health_message = {
+                        'type': 'low_health',
+                        'player_id': player_id
+                    }
+                    server.send_to_player(player_id, low_health_message)
+
+                # Если игрок умер от попадания
+                if player.health <= 0:
+                    death_message = {
+                        'type': 'death',
+                        'player_id': player_id
+                    }
+                    server.send_to_player(player_id, death_message)
+
+                # Добавляем очко тому, кто попал
+                if owner_id in self.players:
+                    shooter = self.players[owner_id]
+                    shooter.score += 1
+
+                    # Проверка выиграл ли стрелок
+                    if shooter.score >= WIN_SCORE:
+                        winner_message = {
+                            'type': 'winner',
+                            'player_id': owner_id
+                        }
+                        self.broadcast_message(server, winner_message)
+
+            # Пуля поражает только одного игрока
+            self.bullets.release(hit_slots)
+
+        self.tick += 1
+        if self.recorder is not None:
+            self.recorder.end_tick(self)
+
+    def broadcast_message(self, server, message):
+        """Отправляет сообщение всем игрокам в комнате"""
+        for player_id in self.players:
+            if player_id in server.clients:
+                try:
+                    server.send_to_player(player_id, message)
+                except:
+                    pass
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'players': {player_id: player.to_dict() for player_id, player in self.players.items()},
+            'bullets': list(self.bullets.snapshot().values()),
+            'platforms': [platform.to_dict() for platform in self.platforms]
+        }
+
+    @staticmethod
+    def from_dict(data):
+        room = Room(data['id'], [Platform.from_dict(
+            platform_data) for platform_data in data['platforms']], data.get('seed'))
+        room.players = {int(player_id): Player.from_dict(player_data)
+                        for player_id, player_data in data['players'].items()}
+        for bullet_data in data['bullets']:
+            room.bullets.spawn(bullet_data['owner_id'], bullet_data['x'], bullet_data['y'],
+                               bullet_data['vel_x'], bullet_data['vel_y'], bullet_data.get('id'))
+        return room
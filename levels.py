@@ -0,0 +1,105 @@
+"""Пул заранее сгенерированных уровней.
+
+Комната создается на пути приема соединения, поэтому генерация уровня
+вынесена в фоновый поток: он держит несколько готовых проверенных уровней
+и пополняет пул, когда комната забирает один из них.
+
+Каждый уровень собирается из своего зерна через random.Random(seed), а
+зерна идут по порядку из генератора пула. N-я взятая комната получает
+N-е зерно и его уровень, как бы ни успевал фоновый поток, поэтому с
+заданным seed пула последовательность уровней воспроизводима.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+from core import generate_level
+
+# Сколько готовых уровней держится в запасе
+POOL_DEPTH = 4
+# Окно, за которое считается скорость пополнения, секунд
+REFILL_RATE_WINDOW = 10
+
+
+class LevelPool:
+    def __init__(self, depth=POOL_DEPTH, generate=generate_level, seed=None):
+        self.depth = depth
+        self.generate = generate
+        self.rng = random.Random(seed)
+        # Зерна, выданные генератором, но еще не взятые комнатами;
+        # первое соответствует следующей взятой комнате
+        self.seeds = deque()
+        # Готовые пары (зерно, платформы) в порядке зерен
+        self.levels = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.generated = 0
+        self.taken = 0
+        # Пул оказался пуст, и уровень пришлось собирать на месте
+        self.misses = 0
+        self.refill_times = deque()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.refill_loop, daemon=True)
+            self.thread.start()
+
+    def seed_at(self, index):
+        """Зерно index-го по счету уровня; вызывается под блокировкой"""
+        while self.taken + len(self.seeds) <= index:
+            self.seeds.append(self.rng.getrandbits(32))
+        return self.seeds[index - self.taken]
+
+    def build(self, seed):
+        return self.generate(random.Random(seed))
+
+    def refill_loop(self):
+        while True:
+            with self.condition:
+                while len(self.levels) >= self.depth:
+                    self.condition.wait()
+                index = self.taken + len(self.levels)
+                seed = self.seed_at(index)
+            platforms = self.build(seed)
+            with self.condition:
+                # Пока уровень собирался, комната могла собрать его сама
+                if index != self.taken + len(self.levels):
+                    continue
+                self.levels.append((seed, platforms))
+                self.generated += 1
+                self.refill_times.append(time.monotonic())
+
+    def take(self):
+        """Пара (зерно, платформы): готовая из пула или собранная на месте"""
+        # Поток запускается при первой комнате: процессу, который сам
+        # комнат не создает (фронт шардированного сервера), он не нужен
+        self.start()
+        with self.condition:
+            seed = self.seed_at(self.taken)
+            self.seeds.popleft()
+            self.taken += 1
+            if self.levels:
+                level = self.levels.popleft()
+                self.condition.notify()
+                return level
+            self.misses += 1
+        return seed, self.build(seed)
+
+    def refill_rate(self):
+        """Уровней в секунду за последнее окно"""
+        horizon = time.monotonic() - REFILL_RATE_WINDOW
+        with self.condition:
+            while self.refill_times and self.refill_times[0] < horizon:
+                self.refill_times.popleft()
+            return len(self.refill_times) / REFILL_RATE_WINDOW
+
+    def stats(self):
+        return {
+            'depth': len(self.levels),
+            'capacity': self.depth,
+            'generated': self.generated,
+            'taken': self.taken,
+            'misses': self.misses,
+            'refill_rate': self.refill_rate()
+        }
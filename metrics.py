@@ -0,0 +1,257 @@
+"""Реестр метрик сервера и их выдача по HTTP.
+
+Счетчики, измеряемые величины и гистограммы с метками хранятся в памяти
+процесса и отдаются в текстовом формате Prometheus на локальном порту:
+
+    python server.py --metrics-port 9100
+    curl http://127.0.0.1:9100/metrics
+
+На том же порту можно повесить служебные команды (например, /profile):
+обработчик получает параметры запроса и возвращает текст ответа.
+Серии с меткой комнаты или игрока удаляются, когда комната или игрок
+исчезают, поэтому реестр не растет со временем работы сервера.
+
+Процессы без своего порта (воркеры комнат) присылают снимок реестра
+из collect(), а реестр фронта отдает его вместе со своими сериями,
+добавив метки источника (например, worker="0").
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Границы корзин гистограмм длительностей, секунд (от 0.1 мс до 0.25 с)
+DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                    0.01, 0.025, 0.05, 0.1, 0.25)
+# Границы корзин сквозных задержек, секунд (от 5 мс до 1 с)
+LATENCY_BUCKETS = (0.005, 0.01, 0.02, 0.033, 0.05, 0.075, 0.1,
+                   0.15, 0.2, 0.3, 0.5, 1.0)
+METRICS_HOST = "127.0.0.1"
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _matching(series, labels):
+    """Ключи серий, у которых есть все указанные метки (и, возможно, другие)"""
+    pairs = set(labels.items())
+    return [key for key in series if pairs.issubset(key)]
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Counter:
+    """Монотонно растущий счетчик, по значению на набор меток"""
+    kind = "counter"
+
+    def __init__(self, name, description, lock):
+        self.name = name
+        self.description = description
+        self.lock = lock
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def remove(self, **labels):
+        with self.lock:
+            for key in _matching(self.values, labels):
+                del self.values[key]
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge:
+    """Текущее значение, читаемое функцией в момент запроса метрик"""
+    kind = "gauge"
+
+    def __init__(self, name, description, read):
+        self.name = name
+        self.description = description
+        self.read = read
+
+    def remove(self, **labels):
+        pass
+
+    def samples(self):
+        return [(self.name, (), self.read())]
+
+
+class Histogram:
+    """Распределение значений по корзинам с суммой и количеством"""
+    kind = "histogram"
+
+    def __init__(self, name, description, lock, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.description = description
+        self.lock = lock
+        self.buckets = buckets
+        # Метки -> [счетчики корзин, сумма, количество]
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def remove(self, **labels):
+        with self.lock:
+            for key in _matching(self.series, labels):
+                del self.series[key]
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((self.name + "_bucket", key + (("le", bound),), cumulative))
+            samples.append((self.name + "_bucket", key + (("le", "+Inf"),), count))
+            samples.append((self.name + "_sum", key, total))
+            samples.append((self.name + "_count", key, count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        # Одна блокировка на реестр: в режиме потоков метрики пишут
+        # поток тиков и потоки клиентов, а читает поток HTTP
+        self.lock = threading.Lock()
+        self.metrics = []
+        # Метки источника -> последний снимок его реестра из collect()
+        self.remote = {}
+
+    def counter(self, name, description):
+        return self._add(Counter(name, description, self.lock))
+
+    def gauge(self, name, description, read):
+        return self._add(Gauge(name, description, read))
+
+    def histogram(self, name, description, buckets=DURATION_BUCKETS):
+        return self._add(Histogram(name, description, self.lock, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def remove(self, **labels):
+        """Удаляет из всех метрик серии, в метках которых есть указанные"""
+        for metric in self.metrics:
+            metric.remove(**labels)
+
+    def collect(self):
+        """Снимок всех метрик из простых типов: его можно передать по каналу"""
+        collected = []
+        for metric in self.metrics:
+            if metric.kind == "gauge":
+                samples = metric.samples()
+            else:
+                with self.lock:
+                    samples = metric.samples()
+            collected.append((metric.name, metric.description, metric.kind, samples))
+        return collected
+
+    def update_remote(self, labels, collected):
+        """Запоминает снимок реестра другого процесса с метками источника"""
+        with self.lock:
+            self.remote[_label_key(labels)] = collected
+
+    def render(self):
+        # Семейства с одним именем у фронта и воркеров выводятся одним блоком
+        families = {}
+        for name, description, kind, samples in self.collect():
+            families[name] = [description, kind, list(samples)]
+        with self.lock:
+            remote = list(self.remote.items())
+        for source, collected in remote:
+            for name, description, kind, samples in collected:
+                family = families.setdefault(name, [description, kind, []])
+                family[2].extend((sample, source + tuple(pairs), value)
+                                 for sample, pairs, value in samples)
+
+        lines = []
+        for name, (description, kind, samples) in families.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample, pairs, value in samples:
+                lines.append(f"{sample}{_format_labels(pairs)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Timer:
+    """Контекст, записывающий длительность блока в гистограмму"""
+
+    def __init__(self, histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+    # Путь -> функция(параметры запроса), возвращающая текст ответа
+    commands = {}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path in ("/", "/metrics"):
+            text = self.registry.render()
+        elif url.path in self.commands:
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                text = self.commands[url.path](query) + "\n"
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+        else:
+            self.send_error(404)
+            return
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Опрос метрик каждые несколько секунд засорил бы вывод сервера
+
+
+def serve_metrics(registry, port, commands=None, host=METRICS_HOST):
+    """Запускает HTTP-сервер метрик в фоновом потоке"""
+    handler = type('RegistryHandler', (MetricsHandler,),
+                   {'registry': registry, 'commands': commands or {}})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print(f"[SERVER] Метрики доступны на http://{host}:{port}/metrics")
+    return httpd
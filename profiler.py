@@ -0,0 +1,154 @@
+"""Профилирование тиков работающего сервера по запросу.
+
+Сервер не нужно перезапускать под профилировщиком: сигнал SIGUSR1 или
+запрос к порту метрик включают профиль следующих N тиков:
+
+    kill -USR1 <pid сервера или воркера>
+    curl "http://127.0.0.1:9100/profile?ticks=600"
+
+Пока профиль включен, работа каждой комнаты (Room.update, снятие состояния
+с to_dict и отправка) идет под своим cProfile, а отдельный поток раз в
+SAMPLE_INTERVAL снимает стек потока тиков. По окончании в каталог
+PROFILE_DIR пишутся общий и покомнатные файлы .pstats (pstats, snakeviz)
+и свернутые стеки .folded для flamegraph.pl и speedscope.
+"""
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+PROFILE_DIR = "profiles"
+# Сколько тиков профилировать по умолчанию (~10 секунд при 30 тиках)
+PROFILE_TICKS = 300
+# Период снятия стека потока тиков, секунд
+SAMPLE_INTERVAL = 0.001
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class ProfileSection:
+    """Участок тика одной комнаты под своим cProfile"""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.profile = profiler.profiles.get(name)
+        if self.profile is None:
+            self.profile = profiler.profiles[name] = cProfile.Profile()
+
+    def __enter__(self):
+        self.profiler.section_name = self.name
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        self.profiler.section_name = None
+
+
+class TickProfiler:
+    def __init__(self, directory=PROFILE_DIR, ticks=PROFILE_TICKS):
+        self.directory = directory
+        self.default_ticks = ticks
+        # Запрос из обработчика сигнала или потока HTTP; применяется
+        # потоком тиков в начале следующего тика
+        self.requested = 0
+        self.remaining = 0
+        self.ticks = 0
+        self.profiles = {}
+        self.samples = Counter()
+        self.section_name = None
+        self.in_tick = False
+        self.thread_id = None
+        self.sampler = None
+        self.stop_sampling = threading.Event()
+
+    def request(self, ticks=None):
+        """Просит профиль следующих ticks тиков; безопасно из обработчика сигнала"""
+        if self.remaining:
+            return False
+        self.requested = ticks or self.default_ticks
+        return True
+
+    def install_signal(self):
+        # Сигналы ставятся только из главного потока и есть не везде
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.request())
+
+    def begin_tick(self):
+        if self.requested and not self.remaining:
+            self.start(self.requested)
+            self.requested = 0
+        self.in_tick = bool(self.remaining)
+
+    def section(self, room_id):
+        if not self.remaining:
+            return nullcontext()
+        return ProfileSection(self, f"room_{room_id}")
+
+    def end_tick(self):
+        self.in_tick = False
+        if not self.remaining:
+            return None
+        self.remaining -= 1
+        if self.remaining == 0:
+            return self.finish()
+        return None
+
+    def start(self, ticks):
+        self.remaining = self.ticks = ticks
+        self.profiles = {}
+        self.samples = Counter()
+        self.thread_id = threading.get_ident()
+        self.stop_sampling.clear()
+        self.sampler = threading.Thread(target=self.sample_loop, daemon=True)
+        self.sampler.start()
+        print(f"[PROFILE] Профилирование следующих {ticks} тиков")
+
+    def sample_loop(self):
+        while not self.stop_sampling.wait(SAMPLE_INTERVAL):
+            if not self.in_tick:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            # Вне комнат тик занят общей работой сервера
+            section = self.section_name or "server"
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            stack.append(section)
+            self.samples[";".join(reversed(stack))] += 1
+
+    def finish(self):
+        """Останавливает профиль и пишет файлы; возвращает префикс их путей"""
+        self.stop_sampling.set()
+        self.sampler.join()
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory,
+                              f"profile_{os.getpid()}_{int(time.time())}")
+
+        combined = None
+        for name, profile in self.profiles.items():
+            profile.dump_stats(f"{prefix}_{name}.pstats")
+            if combined is None:
+                combined = pstats.Stats(profile)
+            else:
+                combined.add(profile)
+        if combined is not None:
+            combined.dump_stats(prefix + ".pstats")
+        with open(prefix + ".folded", 'w', encoding='utf-8') as folded:
+            for stack, count in self.samples.most_common():
+                folded.write(f"{stack} {count}\n")
+
+        print(f"[PROFILE] Профиль {self.ticks} тиков ({len(self.profiles)} комнат, "
+              f"{sum(self.samples.values())} выборок стека) записан в {prefix}.*")
+        self.profiles = {}
+        return prefix
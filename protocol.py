@@ -0,0 +1,282 @@
+"""Сетевой протокол: кадры с 4-байтовым заголовком длины и два формата сообщений.
+
+JSON оставлен для отладки, бинарный формат использует записи фиксированной
+структуры и короткие числовые теги типов. Формат выбирается при рукопожатии
+`init`; декодер определяет его по первому байту кадра.
+"""
+import json
+import struct
+import time
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+# Форматы в порядке предпочтения
+FORMATS = (FORMAT_BINARY, FORMAT_JSON)
+
+HEADER_SIZE = 4
+
+# Теги бинарных сообщений. Все меньше ord('{'), поэтому JSON-кадр
+# однозначно отличается от бинарного по первому байту.
+MSG_STATE = 1
+MSG_DELTA = 2
+MSG_INPUT = 3
+MSG_ACK = 4
+MSG_RESTART = 5
+MSG_RESTART_SUCCESS = 6
+MSG_CHANGE_ROOM = 7
+MSG_WINNER = 8
+MSG_DEATH = 9
+MSG_LOW_HEALTH = 10
+MSG_PING = 11
+MSG_PONG = 12
+
+# Поля сущностей и их типы в бинарных записях (порядок важен)
+PLAYER_FIELDS = (('x', 'f'), ('y', 'f'), ('vel_x', 'f'), ('vel_y', 'f'),
+                 ('health', 'h'), ('score', 'h'), ('is_jumping', '?'),
+                 ('input_seq', 'I'))
+BULLET_FIELDS = (('owner_id', 'I'), ('x', 'f'), ('y', 'f'),
+                 ('vel_x', 'f'), ('vel_y', 'f'))
+ENTITY_FIELDS = {'players': PLAYER_FIELDS, 'bullets': BULLET_FIELDS}
+
+PLAYER_RECORD = struct.Struct('<I' + ''.join(kind for _, kind in PLAYER_FIELDS))
+BULLET_RECORD = struct.Struct('<I' + ''.join(kind for _, kind in BULLET_FIELDS))
+PLATFORM_RECORD = struct.Struct('<ffH')
+
+STATE_HEADER = struct.Struct('<BIIHHH')
+DELTA_HEADER = struct.Struct('<BIIIHHHH')
+# id сущности и битовая маска изменившихся полей
+ENTITY_HEADER = struct.Struct('<IH')
+ID_RECORD = struct.Struct('<I')
+# Флаги, мышь, номер шага и время отправки клиентом (мс по его часам, по модулю 2**32)
+INPUT_RECORD = struct.Struct('<BBhhII')
+ACK_RECORD = struct.Struct('<BII')
+TAG_RECORD = struct.Struct('<B')
+PLAYER_EVENT_RECORD = struct.Struct('<BI')
+# Время клиента в ping, возвращаемое сервером в pong без изменений
+PING_RECORD = struct.Struct('<BI')
+
+INPUT_FLAGS = ('left', 'right', 'jump', 'shoot')
+
+# Неизменный ввод повторяется раз в столько шагов (~0.5 секунды)
+INPUT_HEARTBEAT_TICKS = 15
+
+PLAYER_EVENTS = {'winner': MSG_WINNER, 'death': MSG_DEATH,
+                 'low_health': MSG_LOW_HEALTH}
+PLAYER_EVENT_TYPES = {tag: name for name, tag in PLAYER_EVENTS.items()}
+
+# Структуры для частичных записей дельт, по маске изменившихся полей
+_delta_structs = {}
+
+
+def _delta_struct(kind, mask):
+    key = (kind, mask)
+    record = _delta_structs.get(key)
+    if record is None:
+        fields = ENTITY_FIELDS[kind]
+        record = struct.Struct('<' + ''.join(
+            field_type for bit, (_, field_type) in enumerate(fields) if mask & (1 << bit)))
+        _delta_structs[key] = record
+    return record
+
+
+def client_time_ms(now=None):
+    """Время клиента для ping и вводов: миллисекунды по модулю 2**32"""
+    if now is None:
+        now = time.monotonic()
+    return int(now * 1000) & 0xFFFFFFFF
+
+
+def frame(payload):
+    return len(payload).to_bytes(HEADER_SIZE, byteorder='big') + payload
+
+
+def read_frames(buffer):
+    """Извлекает из буфера все полные кадры, возвращает (кадры, остаток)"""
+    frames = []
+    offset = 0
+    while len(buffer) - offset >= HEADER_SIZE:
+        length = int.from_bytes(buffer[offset:offset + HEADER_SIZE], byteorder='big')
+        if len(buffer) - offset < HEADER_SIZE + length:
+            break  # Не все данные получены
+        start = offset + HEADER_SIZE
+        frames.append(buffer[start:start + length])
+        offset = start + length
+    return frames, buffer[offset:]
+
+
+def encode_message(message, fmt=FORMAT_JSON):
+    """Кодирует сообщение в кадр с заголовком длины"""
+    payload = None
+    if fmt == FORMAT_BINARY:
+        payload = _encode_binary(message)
+    if payload is None:
+        payload = json.dumps(message).encode('utf-8')
+    return frame(payload)
+
+
+def decode_message(payload):
+    if payload[:1] == b'{':
+        return json.loads(payload.decode('utf-8'))
+    return _decode_binary(payload)
+
+
+def _encode_binary(message):
+    """Бинарное представление сообщения или None, если тип передается в JSON"""
+    message_type = message['type']
+    if message_type == 'state':
+        return _encode_state(message)
+    if message_type == 'delta':
+        return _encode_delta(message)
+    if message_type == 'input':
+        flags = 0
+        for bit, name in enumerate(INPUT_FLAGS):
+            if message.get(name):
+                flags |= 1 << bit
+        return INPUT_RECORD.pack(MSG_INPUT, flags, int(message.get('mouse_x', -1)),
+                                 int(message.get('mouse_y', -1)), message.get('seq', 0),
+                                 message.get('t', 0))
+    if message_type == 'ack':
+        return ACK_RECORD.pack(MSG_ACK, message['room_id'], message['seq'])
+    if message_type == 'ping':
+        return PING_RECORD.pack(MSG_PING, message['t'])
+    if message_type == 'pong':
+        return PING_RECORD.pack(MSG_PONG, message['t'])
+    if message_type == 'restart':
+        return TAG_RECORD.pack(MSG_RESTART)
+    if message_type == 'restart_success':
+        return TAG_RECORD.pack(MSG_RESTART_SUCCESS)
+    if message_type == 'change_room':
+        return PLAYER_EVENT_RECORD.pack(MSG_CHANGE_ROOM, message['room_id'])
+    if message_type in PLAYER_EVENTS:
+        return PLAYER_EVENT_RECORD.pack(PLAYER_EVENTS[message_type], message['player_id'])
+    return None
+
+
+def _encode_state(message):
+    room = message['room']
+    parts = [STATE_HEADER.pack(MSG_STATE, message['seq'], room['id'], len(room['players']),
+                               len(room['bullets']), len(room['platforms']))]
+    for player_id, player in room['players'].items():
+        parts.append(PLAYER_RECORD.pack(
+            int(player_id), *(player[name] for name, _ in PLAYER_FIELDS)))
+    for bullet in room['bullets']:
+        parts.append(BULLET_RECORD.pack(
+            bullet['id'], *(bullet[name] for name, _ in BULLET_FIELDS)))
+    for platform in room['platforms']:
+        parts.append(PLATFORM_RECORD.pack(
+            platform['x'], platform['y'], platform['width']))
+    return b''.join(parts)
+
+
+def _encode_delta(message):
+    parts = [DELTA_HEADER.pack(MSG_DELTA, message['seq'], message['base'], message['room_id'],
+                               len(message['players']), len(message['players_removed']),
+                               len(message['bullets']), len(message['bullets_removed']))]
+    for kind in ('players', 'bullets'):
+        fields = ENTITY_FIELDS[kind]
+        for entity_id, changed in message[kind].items():
+            mask = 0
+            values = []
+            for bit, (name, _) in enumerate(fields):
+                if name in changed:
+                    mask |= 1 << bit
+                    values.append(changed[name])
+            parts.append(ENTITY_HEADER.pack(int(entity_id), mask))
+            parts.append(_delta_struct(kind, mask).pack(*values))
+        for entity_id in message[kind + '_removed']:
+            parts.append(ID_RECORD.pack(entity_id))
+    return b''.join(parts)
+
+
+def _decode_binary(payload):
+    tag = payload[0]
+    if tag == MSG_STATE:
+        return _decode_state(payload)
+    if tag == MSG_DELTA:
+        return _decode_delta(payload)
+    if tag == MSG_INPUT:
+        _, flags, mouse_x, mouse_y, seq, sent_at = INPUT_RECORD.unpack_from(payload)
+        message = {'type': 'input', 'seq': seq, 't': sent_at}
+        for bit, name in enumerate(INPUT_FLAGS):
+            message[name] = bool(flags & (1 << bit))
+        if message['shoot']:
+            message['mouse_x'] = mouse_x
+            message['mouse_y'] = mouse_y
+        return message
+    if tag == MSG_ACK:
+        _, room_id, seq = ACK_RECORD.unpack_from(payload)
+        return {'type': 'ack', 'room_id': room_id, 'seq': seq}
+    if tag in (MSG_PING, MSG_PONG):
+        _, sent_at = PING_RECORD.unpack_from(payload)
+        return {'type': 'ping' if tag == MSG_PING else 'pong', 't': sent_at}
+    if tag == MSG_RESTART:
+        return {'type': 'restart'}
+    if tag == MSG_RESTART_SUCCESS:
+        return {'type': 'restart_success'}
+    if tag == MSG_CHANGE_ROOM:
+        _, room_id = PLAYER_EVENT_RECORD.unpack_from(payload)
+        return {'type': 'change_room', 'room_id': room_id}
+    if tag in PLAYER_EVENT_TYPES:
+        _, player_id = PLAYER_EVENT_RECORD.unpack_from(payload)
+        return {'type': PLAYER_EVENT_TYPES[tag], 'player_id': player_id}
+    raise ValueError(f"Неизвестный тип сообщения: {tag}")
+
+
+def _decode_state(payload):
+    _, seq, room_id, num_players, num_bullets, num_platforms = STATE_HEADER.unpack_from(payload)
+    offset = STATE_HEADER.size
+    players = {}
+    for _ in range(num_players):
+        values = PLAYER_RECORD.unpack_from(payload, offset)
+        offset += PLAYER_RECORD.size
+        player = {'id': values[0]}
+        player.update(zip((name for name, _ in PLAYER_FIELDS), values[1:]))
+        players[values[0]] = player
+    bullets = []
+    for _ in range(num_bullets):
+        values = BULLET_RECORD.unpack_from(payload, offset)
+        offset += BULLET_RECORD.size
+        bullet = {'id': values[0]}
+        bullet.update(zip((name for name, _ in BULLET_FIELDS), values[1:]))
+        bullets.append(bullet)
+    platforms = []
+    for _ in range(num_platforms):
+        x, y, width = PLATFORM_RECORD.unpack_from(payload, offset)
+        offset += PLATFORM_RECORD.size
+        platforms.append({'x': x, 'y': y, 'width': width})
+    return {
+        'type': 'state',
+        'seq': seq,
+        'room': {'id': room_id, 'players': players, 'bullets': bullets, 'platforms': platforms}
+    }
+
+
+def _decode_delta(payload):
+    (_, seq, base, room_id, num_players, num_players_removed,
+     num_bullets, num_bullets_removed) = DELTA_HEADER.unpack_from(payload)
+    message = {'type': 'delta', 'seq': seq, 'base': base, 'room_id': room_id}
+    offset = DELTA_HEADER.size
+    counts = {'players': (num_players, num_players_removed),
+              'bullets': (num_bullets, num_bullets_removed)}
+    for kind in ('players', 'bullets'):
+        fields = ENTITY_FIELDS[kind]
+        num_changed, num_removed = counts[kind]
+        changed = {}
+        for _ in range(num_changed):
+            entity_id, mask = ENTITY_HEADER.unpack_from(payload, offset)
+            offset += ENTITY_HEADER.size
+            record = _delta_struct(kind, mask)
+            values = iter(record.unpack_from(payload, offset))
+            offset += record.size
+            entity = {'id': entity_id}
+            for bit, (name, _) in enumerate(fields):
+                if mask & (1 << bit):
+                    entity[name] = next(values)
+            changed[entity_id] = entity
+        removed = []
+        for _ in range(num_removed):
+            removed.append(ID_RECORD.unpack_from(payload, offset)[0])
+            offset += ID_RECORD.size
+        message[kind] = changed
+        message[kind + '_removed'] = removed
+    return message
@@ -0,0 +1,195 @@
+"""Запись и воспроизведение матчей.
+
+Recorder ведет журнал комнаты: заголовок с зерном и уровнем, затем по записи
+на каждый примененный ввод, вход, выход и перезапуск игрока с номером тика.
+Раз в CHECKSUM_INTERVAL тиков пишется контрольная сумма состояния. Replayer
+восстанавливает комнату и прогоняет Room.update без сети и без пауз между
+тиками, сверяя контрольные суммы:
+
+    python replay.py recordings/room_0_1700000000000.rec
+
+Журнал точен в режиме --mode event и в воркерах: там события и тики
+выполняются в одном потоке.
+"""
+import argparse
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from core import Platform, Player, Room
+from protocol import FORMAT_BINARY, FORMAT_JSON, HEADER_SIZE, decode_message, encode_message
+from snapshot import room_state
+
+# 2: вводы несут время отправки клиентом
+# 3: за тик применяются только вводы одного шага клиента
+RECORDING_VERSION = 3
+# Как часто записывать контрольную сумму состояния, тиков
+CHECKSUM_INTERVAL = 150
+# Номер тика и игрока перед кадром каждого сообщения журнала
+RECORD_HEADER = struct.Struct('<II')
+
+
+def state_checksum(room):
+    state = json.dumps(room_state(room), sort_keys=True)
+    return zlib.crc32(state.encode('utf-8'))
+
+
+def encode_record(message):
+    """Бинарный кадр, если он передает сообщение без потерь, иначе JSON"""
+    payload = encode_message(message, FORMAT_BINARY)
+    if decode_message(payload[HEADER_SIZE:]) != message:
+        payload = encode_message(message, FORMAT_JSON)
+    return payload
+
+
+class Recorder:
+    """Журнал одной комнаты, дописываемый в конец файла"""
+
+    def __init__(self, path, room):
+        self.path = path
+        self.file = open(path, 'ab')
+        # В режиме потоков события приходят не из потока тиков
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.file.write(encode_message({
+            'type': 'room',
+            'version': RECORDING_VERSION,
+            'room_id': room.id,
+            'seed': room.seed,
+            'tick': room.tick,
+            'platforms': [platform.to_dict() for platform in room.platforms]
+        }))
+
+    @classmethod
+    def for_room(cls, directory, room):
+        os.makedirs(directory, exist_ok=True)
+        name = f"room_{room.id}_{int(time.time() * 1000)}.rec"
+        return cls(os.path.join(directory, name), room)
+
+    def record(self, tick, player_id, message):
+        record = RECORD_HEADER.pack(tick, player_id) + encode_record(message)
+        with self.lock:
+            self.file.write(record)
+            self.dirty = True
+
+    def end_tick(self, room):
+        if room.tick % CHECKSUM_INTERVAL == 0:
+            self.record(room.tick, 0, {'type': 'checksum', 'value': state_checksum(room)})
+        with self.lock:
+            if self.dirty:
+                self.file.flush()
+                self.dirty = False
+
+    def close(self, room):
+        self.record(room.tick, 0, {'type': 'end', 'value': state_checksum(room)})
+        with self.lock:
+            self.file.close()
+
+
+def read_recording(path):
+    """Заголовок и список (тик, игрок, сообщение); обрезанный хвост отбрасывается"""
+    with open(path, 'rb') as recording:
+        data = recording.read()
+    length = int.from_bytes(data[:HEADER_SIZE], byteorder='big')
+    header = decode_message(data[HEADER_SIZE:HEADER_SIZE + length])
+    offset = HEADER_SIZE + length
+
+    records = []
+    while len(data) - offset >= RECORD_HEADER.size + HEADER_SIZE:
+        tick, player_id = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size + HEADER_SIZE
+        length = int.from_bytes(data[start - HEADER_SIZE:start], byteorder='big')
+        if len(data) - start < length:
+            break  # Сервер остановился посреди записи
+        records.append((tick, player_id, decode_message(data[start:start + length])))
+        offset = start + length
+    return header, records
+
+
+class NullServer:
+    """Сервер для Room.update без сети: сообщения игрокам никуда не уходят"""
+    clients = {}
+
+    def send_to_player(self, player_id, data):
+        pass
+
+
+class Replayer:
+    def __init__(self, path):
+        self.path = path
+        self.header, self.records = read_recording(path)
+        if self.header.get('version') != RECORDING_VERSION:
+            raise ValueError(f"{path}: журнал версии {self.header.get('version')}, "
+                             f"ожидается {RECORDING_VERSION}")
+        self.room = Room(self.header['room_id'],
+                         [Platform.from_dict(platform_data)
+                          for platform_data in self.header['platforms']],
+                         self.header['seed'])
+        self.room.tick = self.header['tick']
+        self.server = NullServer()
+        # Тики, на которых контрольная сумма не совпала с записанной
+        self.mismatches = []
+        self.checked = 0
+
+    def run(self):
+        room = self.room
+        for tick, player_id, message in self.records:
+            while room.tick < tick:
+                room.update(self.server)
+            self.apply(player_id, message)
+        return room.tick
+
+    def apply(self, player_id, message):
+        room = self.room
+        kind = message['type']
+        if kind == 'input':
+            player = room.players.get(player_id)
+            if player is not None:
+                player.queue_input(message)
+        elif kind == 'join':
+            if 'player' in message:
+                player = Player.from_dict(message['player'])
+                player.command = message.get('command')
+                room.add_player(player_id, player)
+            else:
+                room.add_player(player_id)
+        elif kind == 'leave':
+            room.remove_player(player_id)
+        elif kind == 'restart':
+            room.restart_player(player_id)
+        elif kind in ('checksum', 'end'):
+            self.checked += 1
+            if state_checksum(room) != message['value']:
+                self.mismatches.append(room.tick)
+
+
+def run_replay():
+    parser = argparse.ArgumentParser(description="Воспроизведение журнала комнаты")
+    parser.add_argument("recordings", nargs='+', help="файлы журналов .rec")
+    args = parser.parse_args()
+
+    for path in args.recordings:
+        try:
+            replayer = Replayer(path)
+        except ValueError as e:
+            print(f"[REPLAY] {e}")
+            continue
+        started = time.perf_counter()
+        ticks = replayer.run() - replayer.header['tick']
+        elapsed = time.perf_counter() - started
+        rate = ticks / elapsed if elapsed > 0 else float('inf')
+        print(f"[REPLAY] {path}: {ticks} тиков за {elapsed:.3f} с ({rate:.0f} тиков/с), "
+              f"записей {len(replayer.records)}")
+        if replayer.mismatches:
+            print(f"[REPLAY] Расхождение состояния на тиках: {replayer.mismatches[:10]}")
+        else:
+            print(f"[REPLAY] Контрольные суммы совпали: {replayer.checked}")
+        for player_id, player in replayer.room.players.items():
+            print(f"[REPLAY] Игрок {player_id}: очки {player.score}, здоровье {player.health}")
+
+
+if __name__ == "__main__":
+    run_replay()
@@ -0,0 +1,105 @@
+"""Планировщик тиков сервера с фиксированным шагом по монотонным часам"""
+import time
+from collections import deque
+
+TICK_RATE = 30
+# Сколько пропущенных шагов симуляции разрешено догнать за один раз;
+# остальное отставание отбрасывается, чтобы не уйти в спираль перегрузки
+MAX_CATCH_UP_TICKS = 5
+# Сколько последних длительностей тиков хранится для перцентилей
+DURATION_SAMPLES = 4096
+
+
+class TickScheduler:
+    """Считает, сколько шагов симуляции пора выполнить, без накопления дрейфа.
+
+    Сроки тиков отсчитываются от расписания, а не от момента окончания
+    предыдущего тика, поэтому время на обновление и отправку не замедляет
+    частоту симуляции. Перегрузки и пропущенные шаги учитываются в счетчиках.
+    """
+
+    def __init__(self, tick_rate=TICK_RATE, max_catch_up=MAX_CATCH_UP_TICKS, clock=time.monotonic):
+        self.tick_rate = tick_rate
+        self.interval = 1.0 / tick_rate
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.next_tick = None
+        self.started_at = None
+        # Выполненные шаги симуляции
+        self.ticks = 0
+        # Шаги, выполненные вдогонку (больше одного шага за раз)
+        self.catch_up_ticks = 0
+        # Шаги, отброшенные из-за ограничения на догоняющие
+        self.skipped_ticks = 0
+        # Тики, работа которых заняла больше интервала
+        self.overruns = 0
+        # Опоздание последнего выполненного тика относительно расписания
+        self.lateness = 0.0
+        self.max_lateness = 0.0
+        self.max_duration = 0.0
+        self.durations = deque(maxlen=DURATION_SAMPLES)
+
+    def due_ticks(self):
+        """Возвращает число шагов, которые пора выполнить сейчас (0, если рано)"""
+        now = self.clock()
+        if self.next_tick is None:
+            self.next_tick = now
+            self.started_at = now
+        if now < self.next_tick:
+            return 0
+
+        lateness = now - self.next_tick
+        self.lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        steps = int(lateness / self.interval) + 1
+        if steps > self.max_catch_up:
+            self.skipped_ticks += steps - self.max_catch_up
+            steps = self.max_catch_up
+            # Отставание слишком большое - начинаем расписание заново
+            self.next_tick = now + self.interval
+        else:
+            self.next_tick += steps * self.interval
+        if steps > 1:
+            self.catch_up_ticks += steps - 1
+        self.ticks += steps
+        return steps
+
+    def time_until_next(self):
+        if self.next_tick is None:
+            return 0.0
+        return max(0.0, self.next_tick - self.clock())
+
+    def record_duration(self, duration):
+        """Учитывает, сколько заняла работа тика (обновление и отправка)"""
+        self.max_duration = max(self.max_duration, duration)
+        self.durations.append(duration)
+        if duration > self.interval:
+            self.overruns += 1
+
+    def run(self, tick):
+        """Блокирующий цикл: вызывает tick(steps) по расписанию"""
+        while True:
+            steps = self.due_ticks()
+            if steps:
+                started = self.clock()
+                tick(steps)
+                self.record_duration(self.clock() - started)
+            time.sleep(self.time_until_next())
+
+    def achieved_rate(self):
+        if self.started_at is None:
+            return 0.0
+        elapsed = self.clock() - self.started_at
+        return self.ticks / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            'tick_rate': self.tick_rate,
+            'achieved_rate': self.achieved_rate(),
+            'ticks': self.ticks,
+            'catch_up_ticks': self.catch_up_ticks,
+            'skipped_ticks': self.skipped_ticks,
+            'overruns': self.overruns,
+            'max_lateness': self.max_lateness,
+            'max_duration': self.max_duration
+        }
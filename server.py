@@ -1,541 +1,294 @@
+import argparse
 import socket
 import threading
-import json
 import random
-import os
-import pygame
-from pygame.locals import *
-
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
-PLAYER_SIZE = 32
-BULLET_SIZE = 8
-GRAVITY = 0.5
-JUMP_FORCE = -10
-MOVEMENT_SPEED = 5
-BULLET_SPEED = 10
-PLATFORM_HEIGHT = 20
-MAX_PLAYERS = 4
+import selectors
+import time
+from collections import deque
+from core import MAX_PLAYERS, MAX_QUEUED_INPUTS, Room
+from snapshot import HISTORY_SIZE, room_state
+from protocol import FORMATS, FORMAT_JSON, encode_message, decode_message, read_frames
+from connection import Connection
+from scheduler import TICK_RATE, TickScheduler
+from levels import LevelPool
+from replay import Recorder
+from metrics import LATENCY_BUCKETS, MetricsRegistry, Timer, serve_metrics
+from profiler import TickProfiler
+
 PORT = 5555
 SERVER_IP = "127.0.0.1"
-WIN_SCORE = 5
-
-
-class Player:
-    def __init__(self, player_id, x, y):
-        self.id = player_id
-        self.x = x
-        self.y = y
-        self.vel_x = 0
-        self.vel_y = 0
-        self.is_jumping = False
-        self.health = 100
-        self.score = 0
-        self.rect = pygame.Rect(x, y, PLAYER_SIZE, PLAYER_SIZE)
-
-    def update(self, platforms):
-        self.vel_y += GRAVITY
-        self.x += self.vel_x
-        self.y += self.vel_y
-
-        if self.x < 0:
-            self.x = 0
-        if self.x > SCREEN_WIDTH - PLAYER_SIZE:
-            self.x = SCREEN_WIDTH - PLAYER_SIZE
-
-        self.rect.x = self.x
-        self.rect.y = self.y
-
-        on_ground = False
-        for platform in platforms:
-            if (self.rect.bottom >= platform.rect.top and
-                self.rect.bottom <= platform.rect.top + 10 and
-                self.rect.right > platform.rect.left and
-                self.rect.left < platform.rect.right and
-                    self.vel_y > 0):
-                self.rect.bottom = platform.rect.top
-                self.y = self.rect.y
-                self.vel_y = 0
-                on_ground = True
-
-        self.is_jumping = not on_ground
-
-        if self.y > SCREEN_HEIGHT:
-            self.x = random.randint(50, SCREEN_WIDTH - 50)
-            self.y = 0
-            self.vel_y = 0
-            self.health -= 25
-
-        if self.y < 10 and self.y > 0:
-            self.score += 1
-            self.x = random.randint(50, SCREEN_WIDTH - 50)
-            self.y = SCREEN_HEIGHT - 100
-            self.vel_y = 0
-
-    def jump(self):
-        if not self.is_jumping:
-            self.vel_y = JUMP_FORCE
-            self.is_jumping = True
-
-    def move_left(self):
-        self.vel_x = -MOVEMENT_SPEED
-
-    def move_right(self):
-        self.vel_x = MOVEMENT_SPEED
-
-    def stop(self):
-        self.vel_x = 0
-
-    def shoot(self):
-        bullet = Bullet(self.id, self.x + PLAYER_SIZE //
-                        2, self.y + PLAYER_SIZE//2)
-        return bullet
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'x': self.x,
-            'y': self.y,
-            'vel_x': self.vel_x,
-            'vel_y': self.vel_y,
-            'health': self.health,
-            'score': self.score
-        }
-
-    @staticmethod
-    def from_dict(data):
-        player = Player(data['id'], data['x'], data['y'])
-        player.vel_x = data['vel_x']
-        player.vel_y = data['vel_y']
-        player.health = data['health']
-        player.score = data['score']
-        return player
-
-
-class Bullet:
-    def __init__(self, owner_id, x, y):
-        self.owner_id = owner_id
-        self.x = x
-        self.y = y
-        self.vel_x = 0
-        self.vel_y = -BULLET_SPEED
-        self.rect = pygame.Rect(x, y, BULLET_SIZE, BULLET_SIZE)
-
-    def update(self):
-        self.x += self.vel_x
-        self.y += self.vel_y
-        self.rect.x = self.x
-        self.rect.y = self.y
-
-        if (self.x < 0 or self.x > SCREEN_WIDTH or
-                self.y < 0 or self.y > SCREEN_HEIGHT):
-            return False
-        return True
-
-    def to_dict(self):
-        return {
-            'owner_id': self.owner_id,
-            'x': self.x,
-            'y': self.y,
-            'vel_x': self.vel_x,
-            'vel_y': self.vel_y
-        }
+# Как часто печатать сводку о перегрузке тиков, секунд
+SCHEDULER_REPORT_INTERVAL = 10
 
-    @staticmethod
-    def from_dict(data):
-        bullet = Bullet(data['owner_id'], data['x'], data['y'])
-        bullet.vel_x = data['vel_x']
-        bullet.vel_y = data['vel_y']
-        return bullet
-
-
-class Platform:
-    def __init__(self, x, y, width):
-        self.x = x
-        self.y = y
-        self.width = width
-        self.height = PLATFORM_HEIGHT
-        self.rect = pygame.Rect(x, y, width, self.height)
-
-    def to_dict(self):
-        return {
-            'x': self.x,
-            'y': self.y,
-            'width': self.width
-        }
-
-    @staticmethod
-    def from_dict(data):
-        return Platform(data['x'], data['y'], data['width'])
-
-
-class Room:
-    def __init__(self, room_id):
-        self.id = room_id
-        self.players = {}
-        self.bullets = []
-        self.platforms = self.generate_platforms()
-        self.clients = {}  # Добавлено для хранения связи игроков с их сокетами
-
-    def generate_platforms(self):
-        platforms = []
-        # Основная платформа (земля)
-        platforms.append(Platform(0, SCREEN_HEIGHT - 20, SCREEN_WIDTH))
-
-        # Параметры прыжка
-        jump_height = (JUMP_FORCE**2) / (2 * GRAVITY)
-        jump_time = (2 * abs(JUMP_FORCE)) / GRAVITY
-        max_horizontal = MOVEMENT_SPEED * jump_time
-
-        # Минимальная высота между платформами (половина высоты прыжка)
-        min_vertical_distance = jump_height * 0.5
-
-        grid_size = 30
-        grid = [[False for _ in range((SCREEN_HEIGHT // grid_size) + 1)]
-                for _ in range((SCREEN_WIDTH // grid_size) + 1)]
-
-        for x in range(SCREEN_WIDTH // grid_size):
-            for y in range(3):
-                if (SCREEN_HEIGHT // grid_size) - y >= 0:
-                    grid[x][(SCREEN_HEIGHT // grid_size) - y] = True
-
-        top_target_y = 20 
-
-        # Создаем несколько "путей" наверх
-        num_paths = random.randint(2, 3)
-        path_starting_points = [random.randint(
-            100, SCREEN_WIDTH - 300) for _ in range(num_paths)]
-
-        # Минимальное расстояние между путями
-        min_path_distance = 150
-        path_starting_points.sort()
-
-        # Обеспечиваем минимальное расстояние между путями
-        for i in range(1, len(path_starting_points)):
-            if path_starting_points[i] - path_starting_points[i-1] < min_path_distance:
-                path_starting_points[i] = path_starting_points[i -
-                                                               1] + min_path_distance
-                if path_starting_points[i] > SCREEN_WIDTH - 150:
-                    path_starting_points[i] = SCREEN_WIDTH - 150
-
-        # Генерируем платформы для каждого пути
-        for path_index, start_x in enumerate(path_starting_points):
-            current_x = start_x
-            current_y = SCREEN_HEIGHT - 20 - jump_height * 0.8
-
-            height_to_top = (SCREEN_HEIGHT - 20) - top_target_y
-            step_height = min_vertical_distance * 1.2
-            platforms_to_top = int(height_to_top / step_height) + 1
-
-            platforms_in_path = max(4, min(platforms_to_top, 8))
-
-            height_per_platform = height_to_top / (platforms_in_path)
-            path_platform_heights = []
-
-            for i in range(platforms_in_path):
-                platform_width = random.randint(80, 150)
-
-                current_x = max(
-                    10, min(current_x, SCREEN_WIDTH - platform_width - 10))
-
-                if path_platform_heights:
-                    too_close = False
-                    for existing_y in path_platform_heights:
-                        if abs(current_y - existing_y) < min_vertical_distance:
-                            too_close = True
-                            break
-
-                    if too_close:
-                        closest_height = min(
-                            path_platform_heights, key=lambda y: abs(y - current_y))
-                        if current_y > closest_height:
-                            current_y = closest_height + min_vertical_distance
-                        else:
-                            current_y = closest_height - min_vertical_distance
-                new_platform = Platform(current_x, current_y, platform_width)
-
-                platform_cells = []
-                for px in range(int(current_x) // grid_size,
-                                (int(current_x) + platform_width) // grid_size + 1):
-                    if 0 <= px < len(grid):
-                        py = int(current_y) // grid_size
-                        if 0 <= py < len(grid[0]):
-                            platform_cells.append((px, py))
-
-                too_close_to_other_platforms = False
-                for platform in platforms[1:]:
-                    if abs(platform.y - current_y) < min_vertical_distance:
-                        if (current_x < platform.x + platform.width and
-                                current_x + platform_width > platform.x):
-                            too_close_to_other_platforms = True
-                            break
-
-                # Если нет пересечений и соблюдается минимальное расстояние, добавляем платформу
-                if (not any(grid[px][py] for px, py in platform_cells if px < len(grid) and py < len(grid[0])) and
-                        not too_close_to_other_platforms):
-                    platforms.append(new_platform)
-                    path_platform_heights.append(current_y)
-
-                    for px, py in platform_cells:
-                        if px < len(grid) and py < len(grid[0]):
-                            grid[px][py] = True
-                if i == platforms_in_path - 2:
-                    current_y = top_target_y + jump_height * 0.3
-                else:
-                    height_change = max(
-                        min_vertical_distance, height_per_platform * random.uniform(0.8, 1.2))
-                    current_y -= height_change
-
-                max_shift = max_horizontal * 0.85
-
-                # В зависимости от номера пути, смещаем платформы в разных направлениях
-                if path_index % 2 == 0:
-                    horizontal_shift = random.uniform(-max_shift, max_shift/2)
-                else:
-                    horizontal_shift = random.uniform(-max_shift/2, max_shift)
-
-                current_x += horizontal_shift
-
-        # Добавляем финальную "верхнюю" платформу для каждого пути
-        for path_index, start_x in enumerate(path_starting_points):
-            highest_platform = None
-            highest_y = SCREEN_HEIGHT
-
-            for platform in platforms[1:]:  # Пропускаем землю
-                if platform.y < highest_y:
-                    highest_y = platform.y
-                    highest_platform = platform
-
-            if highest_platform:
-                final_x = highest_platform.x + \
-                    random.uniform(-max_horizontal*0.5, max_horizontal*0.5)
-                final_y = top_target_y  # Размещаем у самого верха
-                # Чуть шире для надежности
-                final_width = random.randint(100, 180)
-
-                final_x = max(
-                    10, min(final_x, SCREEN_WIDTH - final_width - 10))
-
-                can_place = True
-                for platform in platforms:
-                    # Проверяем пересечения
-                    if (final_x < platform.x + platform.width and
-                            final_x + final_width > platform.x):
-                        # Если платформы могут пересекаться по горизонтали, проверяем вертикальное расстояние
-                        if abs(platform.y - final_y) < min_vertical_distance:
-                            can_place = False
-                            break
-
-                if can_place:
-                    platforms.append(Platform(final_x, final_y, final_width))
-
-        # Добавляем несколько соединительных платформ между путями
-        if len(platforms) > 5:
-            for _ in range(random.randint(2, 4)):
-                if len(platforms) < 3:
-                    break
-
-                plat1_index = random.randint(1, len(platforms) - 1)
-                plat2_index = random.randint(1, len(platforms) - 1)
-
-                attempts = 0
-                while (plat1_index == plat2_index or
-                       abs(platforms[plat1_index].y - platforms[plat2_index].y) < min_vertical_distance) and attempts < 10:
-                    plat2_index = random.randint(1, len(platforms) - 1)
-                    attempts += 1
-
-                if plat1_index == plat2_index or abs(platforms[plat1_index].y - platforms[plat2_index].y) < min_vertical_distance:
-                    continue
-
-                plat1 = platforms[plat1_index]
-                plat2 = platforms[plat2_index]
-
-                if abs(plat1.y - plat2.y) < jump_height * 0.5 and abs(plat1.y - plat2.y) >= min_vertical_distance:
-                    connect_x = (plat1.x + plat2.x) / 2
-                    connect_y = (plat1.y + plat2.y) / 2
-                    connect_width = random.randint(70, 120)
-
-                    can_place = True
-                    for platform in platforms:
-                        if (connect_x < platform.x + platform.width and
-                                connect_x + connect_width > platform.x):
-                            if abs(platform.y - connect_y) < min_vertical_distance:
-                                can_place = False
-                                break
-
-                    if can_place:
-                        platforms.append(
-                            Platform(connect_x, connect_y, connect_width))
-
-        return platforms
-
-    def update(self, server):
-        # Проверка на победу
-        for player_id, player in list(self.players.items()):
-            if player.score >= WIN_SCORE:
-                # Отправляем сообщение всем игрокам о победителе
-                winner_message = {
-                    'type': 'winner',
-                    'player_id': player_id
-                }
-                self.broadcast_message(server, winner_message)
-
-        # Обновление игроков
-        for player_id, player in list(self.players.items()):
-            old_health = player.health
-            player.update(self.platforms)
-
-            # Проверка низкого здоровья
-            if old_health > 30 and player.health <= 30:
-                # Отправляем предупреждение о низком здоровье
-                low_health_message = {
-                    'type': 'low_health',
-                    'player_id': player_id
-                }
-                if player_id in server.clients:
-                    server.send_data(
-                        server.clients[player_id]['socket'], low_health_message)
-
-            # Проверка на смерть
-            if player.health <= 0:
-                # Отправляем сообщение о смерти
-                death_message = {
-                    'type': 'death',
-                    'player_id': player_id
-                }
-                if player_id in server.clients:
-                    server.send_data(
-                        server.clients[player_id]['socket'], death_message)
-
-                # Удаляем игрока из комнаты
-                del self.players[player_id]
-
-        # Обновление пуль и обработка попаданий
-        updated_bullets = []
-        for bullet in self.bullets:
-            if bullet.update():
-                hit = False
-                for player_id, player in self.players.items():
-                    if player_id != bullet.owner_id and player.rect.colliderect(bullet.rect):
-                        player.health -= 10
-                        hit = True
-
-                        # Если здоровье игрока стало критическим после попадания
-                        if player.health <= 30 and player.health > 0:
-                            low_health_message = {
-                                'type': 'low_health',
-                                'player_id': player_id
-                            }
-                            if player_id in server.clients:
-                                server.send_data(
-                                    server.clients[player_id]['socket'], low_health_message)
-
-                        # Если игрок умер от попадания
-                        if player.health <= 0:
-                            death_message = {
-                                'type': 'death',
-                                'player_id': player_id
-                            }
-                            if player_id in server.clients:
-                                server.send_data(
-                                    server.clients[player_id]['socket'], death_message)
-
-                        # Добавляем очко тому, кто попал
-                        if bullet.owner_id in self.players:
-                            shooter = self.players[bullet.owner_id]
-                            shooter.score += 1
-
-                            # Проверка выиграл ли стрелок
-                            if shooter.score >= WIN_SCORE:
-                                winner_message = {
-                                    'type': 'winner',
-                                    'player_id': bullet.owner_id
-                                }
-                                self.broadcast_message(server, winner_message)
-
-                        break
-                if not hit:
-                    updated_bullets.append(bullet)
-            else:
-                # Пуля вышла за пределы экрана
-                pass
-        self.bullets = updated_bullets
-
-    def broadcast_message(self, server, message):
-        """Отправляет сообщение всем игрокам в комнате"""
-        for player_id in self.players:
-            if player_id in server.clients:
-                try:
-                    server.send_data(
-                        server.clients[player_id]['socket'], message)
-                except:
-                    pass
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'players': {player_id: player.to_dict() for player_id, player in self.players.items()},
-            'bullets': [bullet.to_dict() for bullet in self.bullets],
-            'platforms': [platform.to_dict() for platform in self.platforms]
-        }
-
-    @staticmethod
-    def from_dict(data):
-        room = Room(data['id'])
-        room.players = {int(player_id): Player.from_dict(player_data)
-                        for player_id, player_data in data['players'].items()}
-        room.bullets = [Bullet.from_dict(bullet_data)
-                        for bullet_data in data['bullets']]
-        room.platforms = [Platform.from_dict(
-            platform_data) for platform_data in data['platforms']]
-        return room
+# Сетевые режимы сервера
+NETWORK_THREADS = "threads"
+NETWORK_EVENT_LOOP = "event"
 
 
 class Server:
-    def __init__(self, host, port):
+    def __init__(self, host, port, tick_rate=TICK_RATE, record_dir=None, seed=None):
         self.host = host
         self.port = port
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(
-            socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket = None
         self.clients = {}
         self.rooms = {}
+        # Шаг комнаты в tick и ее удаление из потока клиента (режим threads)
+        self.rooms_lock = threading.Lock()
         self.next_player_id = 0
         self.next_room_id = 0
+        self.scheduler = TickScheduler(tick_rate)
+        self.last_scheduler_report = time.monotonic()
+        self.reported_overruns = 0
+        self.reported_skipped = 0
+        # С заданным seed зерна комнат, а значит и их уровни и случайность
+        # в игре, одинаковы от запуска к запуску
+        self.rng = random.Random(seed)
+        self.level_pool = LevelPool(seed=self.rng.getrandbits(32))
+        self.reported_levels_taken = 0
+        # Каталог для журналов комнат (None - не записывать)
+        self.record_dir = record_dir
+        self.metrics = MetricsRegistry()
+        self.register_metrics()
+        # Профиль следующих тиков по SIGUSR1 или команде /profile
+        self.profiler = TickProfiler()
+
+    def register_metrics(self):
+        metrics = self.metrics
+        self.room_update_time = metrics.histogram(
+            'room_update_seconds', "Длительность Room.update по комнатам")
+        self.tick_time = metrics.histogram(
+            'tick_seconds', "Длительность тика: обновление и рассылка всех комнат")
+        self.tick_lateness = metrics.histogram(
+            'tick_lateness_seconds', "Опоздание начала тика относительно расписания")
+        self.input_applied_time = metrics.histogram(
+            'input_applied_seconds', "От прихода ввода до снимка, в котором он применен",
+            LATENCY_BUCKETS)
+        self.input_acked_time = metrics.histogram(
+            'input_acked_seconds', "От прихода ввода до подтверждения клиентом снимка с ним",
+            LATENCY_BUCKETS)
+        self.serialize_time = metrics.histogram(
+            'serialize_seconds', "Время снятия состояния и кодирования сообщений")
+        self.send_failures = metrics.counter(
+            'send_failures_total', "Ошибки при постановке кадров в очередь соединения")
+        self.register_connection_metrics()
+        self.register_room_metrics()
+
+    def register_connection_metrics(self):
+        """Величины процесса, который сам держит сокеты клиентов"""
+        metrics = self.metrics
+        self.messages_total = metrics.counter(
+            'messages_total', "Сообщения от клиентов (in) и к клиентам (out)")
+        self.bytes_total = metrics.counter(
+            'bytes_total', "Байты от клиентов (in) и поставленные в очередь к ним (out)")
+        self.client_messages = metrics.counter(
+            'client_messages_total', "Сообщения по подключенным клиентам")
+        self.client_bytes = metrics.counter(
+            'client_bytes_total', "Байты по подключенным клиентам")
+        metrics.gauge('clients_connected', "Подключенные клиенты", lambda: len(self.clients))
+        metrics.gauge('queued_frames', "Кадры в исходящих очередях соединений",
+                      lambda: sum(len(client['connection'].queue)
+                                  for client in list(self.clients.values())))
+        metrics.gauge('dropped_snapshots', "Выброшенные снимки у подключенных клиентов",
+                      lambda: sum(getattr(client['connection'], 'dropped_snapshots', 0)
+                                  for client in list(self.clients.values())))
+
+    def register_room_metrics(self):
+        """Величины процесса, который сам обновляет комнаты"""
+        metrics = self.metrics
+        metrics.gauge('rooms_active', "Активные комнаты", self.room_count)
+        metrics.gauge('players_active', "Живые игроки во всех комнатах",
+                      lambda: sum(len(room.players) for room in list(self.rooms.values())))
+        metrics.gauge('bullets_active', "Пули во всех комнатах",
+                      lambda: sum(len(room.bullets) for room in list(self.rooms.values())))
+        metrics.gauge('tick_rate_achieved', "Фактическая частота тиков",
+                      self.scheduler.achieved_rate)
+        metrics.gauge('tick_overruns', "Тики дольше интервала",
+                      lambda: self.scheduler.overruns)
+        metrics.gauge('ticks_skipped', "Отброшенные шаги симуляции",
+                      lambda: self.scheduler.skipped_ticks)
+        metrics.gauge('level_pool_depth', "Готовые уровни в пуле",
+                      lambda: len(self.level_pool.levels))
+        metrics.gauge('level_pool_refill_rate', "Пополнение пула уровней, уровней в секунду",
+                      self.level_pool.refill_rate)
+        metrics.gauge('level_pool_misses', "Уровни, собранные на месте из-за пустого пула",
+                      lambda: self.level_pool.misses)
+
+    def profile_ticks(self, query):
+        ticks = int(query.get('ticks', self.profiler.default_ticks))
+        if ticks <= 0:
+            raise ValueError("ticks должно быть положительным")
+        return ticks
+
+    def request_profile(self, query):
+        """Команда /profile порта метрик: профиль следующих ticks тиков"""
+        ticks = self.profile_ticks(query)
+        if not self.profiler.request(ticks):
+            return "профиль уже снимается"
+        return f"профиль следующих {ticks} тиков будет записан в {self.profiler.directory}"
+
+    def install_profile_signal(self):
+        self.profiler.install_signal()
+
+    def room_count(self):
+        return len(self.rooms)
 
-    def start(self):
+    @staticmethod
+    def new_input_trace():
+        return {
+            # (номер ввода, время прихода) еще не примененных вводов
+            'input_arrivals': deque(maxlen=MAX_QUEUED_INPUTS),
+            # (номер снимка, времена прихода примененных в нем вводов)
+            'awaiting_ack': deque(maxlen=HISTORY_SIZE)
+        }
+
+    def trace_applied_inputs(self, client, player, seq, now):
+        """Вводы, которые снимок seq показывает примененными"""
+        arrivals = client['input_arrivals']
+        applied = []
+        while arrivals and arrivals[0][0] <= player.input_seq:
+            received_at = arrivals.popleft()[1]
+            self.input_applied_time.observe(now - received_at)
+            applied.append(received_at)
+        if applied:
+            client['awaiting_ack'].append((seq, applied))
+
+    def trace_acked_inputs(self, client, seq, now):
+        awaiting = client['awaiting_ack']
+        while awaiting and awaiting[0][0] <= seq:
+            for received_at in awaiting.popleft()[1]:
+                self.input_acked_time.observe(now - received_at)
+
+    def count_traffic(self, player_id, direction, size, messages=1):
+        self.messages_total.inc(messages, direction=direction)
+        self.bytes_total.inc(size, direction=direction)
+        self.client_messages.inc(messages, player=player_id, direction=direction)
+        self.client_bytes.inc(size, player=player_id, direction=direction)
+
+    def start(self, mode=NETWORK_THREADS):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(
+            socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.server_socket.listen(socket.SOMAXCONN)
         print(f"[SERVER] Сервер запущен на {self.host}:{self.port}")
+        self.install_profile_signal()
 
         self.create_room()
 
+        try:
+            if mode == NETWORK_EVENT_LOOP:
+                self.run_event_loop()
+            else:
+                self.run_threaded()
+        except KeyboardInterrupt:
+            print("[SERVER] Сервер остановлен")
+        finally:
+            self.server_socket.close()
+
+    def run_threaded(self):
+        """Поток на каждое соединение и отдельный поток обновления комнат"""
         update_thread = threading.Thread(target=self.update_loop)
         update_thread.daemon = True
         update_thread.start()
 
-        try:
-            while True:
+        while True:
+            client_socket, address = self.server_socket.accept()
+            print(f"[SERVER] Новое подключение: {address}")
+
+            client_thread = threading.Thread(
+                target=self.handle_client, args=(client_socket, address))
+            client_thread.daemon = True
+            client_thread.start()
+
+    def run_event_loop(self):
+        """Однопоточный режим: один цикл selectors обслуживает все сокеты
+        и сам обновляет комнаты, поэтому общие структуры не нужно защищать"""
+        selector = selectors.DefaultSelector()
+        self.server_socket.setblocking(False)
+        selector.register(self.server_socket, selectors.EVENT_READ)
+
+        while True:
+            for key, events in selector.select(self.scheduler.time_until_next()):
+                if key.fileobj is self.server_socket:
+                    self.accept_event_client(selector)
+                else:
+                    self.handle_client_events(selector, key, events)
+
+            steps = self.scheduler.due_ticks()
+            if steps:
+                started = time.monotonic()
+                self.tick(steps)
+                self.scheduler.record_duration(time.monotonic() - started)
+
+            self.update_write_interest(selector)
+
+    def update_write_interest(self, selector):
+        # Ждем готовности к записи только для соединений с непустой очередью
+        for player_id, client in self.clients.items():
+            events = selectors.EVENT_READ
+            if client['connection'].has_pending():
+                events |= selectors.EVENT_WRITE
+            if selector.get_key(client['socket']).events != events:
+                selector.modify(client['socket'], events, player_id)
+
+    def accept_event_client(self, selector):
+        # Принимаем всю очередь: под нагрузкой цикл просыпается редко,
+        # и по одному подключению за тик новые игроки ждали бы секундами
+        while True:
+            try:
                 client_socket, address = self.server_socket.accept()
-                print(f"[SERVER] Новое подключение: {address}")
+            except BlockingIOError:
+                return
+            print(f"[SERVER] Новое подключение: {address}")
+            player_id = self.add_client(client_socket, address)
+            selector.register(client_socket, selectors.EVENT_READ, player_id)
 
-                client_thread = threading.Thread(
-                    target=self.handle_client, args=(client_socket, address))
-                client_thread.daemon = True
-                client_thread.start()
-        except KeyboardInterrupt:
-            print("[SERVER] Сервер остановлен")
-        finally:
-            self.server_socket.close()
+    def handle_client_events(self, selector, key, events):
+        player_id = key.data
+        client = self.clients[player_id]
+        try:
+            if events & selectors.EVENT_WRITE:
+                client['connection'].flush()
+            if events & selectors.EVENT_READ:
+                data = client['socket'].recv(4096)
+                if not data:
+                    raise ConnectionResetError("соединение закрыто клиентом")
+                self.receive_data(player_id, data)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except Exception as e:
+            if not isinstance(e, ConnectionResetError):
+                print(
+                    f"[SERVER] Ошибка при обработке клиента {player_id}: {e}")
+            selector.unregister(client['socket'])
+            self.remove_client(player_id, client['socket'], client['address'])
 
     def create_room(self):
         room_id = self.next_room_id
-        self.rooms[room_id] = Room(room_id)
+        self.rooms[room_id] = self.new_room(room_id)
         self.next_room_id += 1
         print(f"[SERVER] Создана комната {room_id}")
         return room_id
 
-    def handle_client(self, client_socket, address):
+    def new_room(self, room_id):
+        seed, platforms = self.level_pool.take()
+        room = Room(room_id, platforms, seed)
+        if self.record_dir is not None:
+            room.recorder = Recorder.for_room(self.record_dir, room)
+        return room
+
+    def delete_room(self, room_id):
+        # После pop под блокировкой tick комнату больше не обновляет,
+        # поэтому журнал закрывается уже после ее последнего шага
+        with self.rooms_lock:
+            room = self.rooms.pop(room_id)
+            if room.recorder is not None:
+                room.recorder.close(room)
+        self.metrics.remove(room=room_id)
+        print(f"[SERVER] Комната {room_id} удалена")
+
+    def add_client(self, client_socket, address):
+        """Размещает нового игрока в свободной комнате и отправляет ему init"""
         player_id = self.next_player_id
         self.next_player_id += 1
 
@@ -548,78 +301,113 @@ class Server:
         if room_id is None:
             room_id = self.create_room()
 
-        x = random.randint(50, SCREEN_WIDTH - 50)
-        y = SCREEN_HEIGHT - 100
-        player = Player(player_id, x, y)
-
-        self.rooms[room_id].players[player_id] = player
+        self.rooms[room_id].add_player(player_id)
         # Сохраняем связь между комнатой и сокетами игроков
         self.rooms[room_id].clients[player_id] = client_socket
 
-        self.clients[player_id] = {
+        connection = Connection(client_socket)
+        self.clients[player_id] = client = {
             'socket': client_socket,
-            'room_id': room_id
+            'connection': connection,
+            'room_id': room_id,
+            # Последний снимок, подтвержденный клиентом (база для дельт)
+            'acked_seq': None,
+            # Полный снимок, отправленный, но еще не подтвержденный
+            'full_seq': None,
+            # Формат сообщений выбирается клиентом в ответе на init
+            'format': FORMAT_JSON,
+            'address': address,
+            # Недочитанный хвост входящих данных
+            'buffer': b''
         }
+        client.update(self.new_input_trace())
 
-        self.send_data(client_socket, {
+        size = self.send_data(connection, {
             'type': 'init',
             'player_id': player_id,
-            'room_id': room_id
+            'room_id': room_id,
+            'formats': list(FORMATS),
+            'tick_rate': self.scheduler.tick_rate
         })
+        if size:
+            self.count_traffic(player_id, 'out', size)
+
+        return player_id
 
-        buffer = b''
+    def handle_client(self, client_socket, address):
+        player_id = self.add_client(client_socket, address)
+        connection = self.clients[player_id]['connection']
+        # selectors, а не select.select: тот не принимает дескрипторы >= 1024
+        selector = selectors.DefaultSelector()
+        selector.register(client_socket, selectors.EVENT_READ)
         try:
             while True:
+                # Сокет неблокирующий: ждем входящих данных, а если в очереди
+                # остались недописанные кадры - и готовности к записи
+                events = selectors.EVENT_READ
+                if connection.has_pending():
+                    events |= selectors.EVENT_WRITE
+                if selector.get_key(client_socket).events != events:
+                    selector.modify(client_socket, events)
+                ready = 0
+                for _, mask in selector.select():
+                    ready |= mask
+                if ready & selectors.EVENT_WRITE:
+                    connection.flush()
+                if not ready & selectors.EVENT_READ:
+                    continue
+
                 data = client_socket.recv(4096)
                 if not data:
                     break
 
-                buffer += data
-
-                # Обработка фрагментированных данных
-                while len(buffer) >= 4:
-                    message_length = int.from_bytes(
-                        buffer[:4], byteorder='big')
-
-                    # Если полное сообщение еще не получено
-                    if len(buffer) < 4 + message_length:
-                        break
-
-                    # Извлекаем сообщение
-                    message_data = buffer[4:4+message_length]
-                    buffer = buffer[4+message_length:]
-
-                    # Обрабатываем сообщение
-                    message = json.loads(message_data.decode('utf-8'))
-                    self.process_client_message(player_id, message)
+                self.receive_data(player_id, data)
 
         except Exception as e:
             print(f"[SERVER] Ошибка при обработке клиента {player_id}: {e}")
         finally:
-            if player_id in self.clients:
-                room_id = self.clients[player_id]['room_id']
-                if room_id in self.rooms:
-                    room = self.rooms[room_id]
-                    if player_id in room.players:
-                        del room.players[player_id]
-                    if player_id in room.clients:
-                        del room.clients[player_id]
-                    print(
-                        f"[SERVER] Игрок {player_id} покинул комнату {room_id}")
-
-                    if len(room.players) == 0:
-                        del self.rooms[room_id]
-                        print(f"[SERVER] Комната {room_id} удалена")
-
-                del self.clients[player_id]
-
-            client_socket.close()
-            print(f"[SERVER] Клиент {address} отключен")
+            selector.close()
+            self.remove_client(player_id, client_socket, address)
+
+    def receive_data(self, player_id, data):
+        client = self.clients[player_id]
+        # Обработка фрагментированных данных
+        frames, client['buffer'] = read_frames(client['buffer'] + data)
+        self.count_traffic(player_id, 'in', len(data), len(frames))
+        for message_data in frames:
+            message = decode_message(message_data)
+            self.process_client_message(player_id, message)
+
+    def remove_client(self, player_id, client_socket, address):
+        self.detach_player(player_id)
+        client_socket.close()
+        print(f"[SERVER] Клиент {address} отключен")
+
+    def detach_player(self, player_id):
+        """Убирает игрока из его комнаты и удаляет опустевшую комнату"""
+        if player_id in self.clients:
+            room_id = self.clients[player_id]['room_id']
+            if room_id in self.rooms:
+                room = self.rooms[room_id]
+                room.remove_player(player_id)
+                print(
+                    f"[SERVER] Игрок {player_id} покинул комнату {room_id}")
+
+                if len(room.players) == 0:
+                    self.delete_room(room_id)
+
+            del self.clients[player_id]
+            self.metrics.remove(player=player_id)
 
     def process_client_message(self, player_id, message):
         if player_id not in self.clients:
             return
 
+        if message['type'] == 'ping':
+            # Отвечаем сразу, не дожидаясь тика: клиент меряет чистый RTT
+            self.send_to_player(player_id, {'type': 'pong', 't': message['t']})
+            return
+
         room_id = self.clients[player_id]['room_id']
         if room_id not in self.rooms:
             return
@@ -627,72 +415,45 @@ class Server:
         room = self.rooms[room_id]
         player = room.players.get(player_id)
 
-        if message['type'] == 'input':
+        if message['type'] == 'init':
+            # Ответ на рукопожатие: клиент выбирает формат сообщений
+            if message.get('format') in FORMATS:
+                self.clients[player_id]['format'] = message['format']
+
+        elif message['type'] == 'input':
             if not player:
                 return
 
-            if message.get('left'):
-                player.move_left()
-            elif message.get('right'):
-                player.move_right()
-            else:
-                player.stop()
-
-            if message.get('jump'):
-                player.jump()
-
-            if message.get('shoot'):
-                # Получаем координаты мыши из сообщения
-                target_x = message.get('mouse_x', player.x)
-                target_y = message.get('mouse_y', player.y - 100)
-
-                # Вычисляем направление
-                start_x = player.x + PLAYER_SIZE//2
-                start_y = player.y + PLAYER_SIZE//2
-                dx = target_x - start_x
-                dy = target_y - start_y
-                distance = max(1, (dx**2 + dy**2)**0.5)
-
-                # Нормализуем и задаем скорость
-                speed = BULLET_SPEED
-                bullet_vel_x = (dx / distance) * speed
-                bullet_vel_y = (dy / distance) * speed
-
-                bullet = Bullet(player.id, start_x, start_y)
-                bullet.vel_x = bullet_vel_x
-                bullet.vel_y = bullet_vel_y
-                room.bullets.append(bullet)
+            # Ввод применяется на границе тика, а не в момент прихода
+            player.queue_input(message)
+            self.clients[player_id]['input_arrivals'].append(
+                (message.get('seq', 0), time.monotonic()))
+
+        elif message['type'] == 'ack':
+            # Клиент подтверждает получение снимка своей текущей комнаты
+            client = self.clients[player_id]
+            seq = message.get('seq')
+            if message.get('room_id') == room_id and seq is not None:
+                # Подтверждения снимков до последнего полного устарели:
+                # клиент уже сбросил свою историю
+                if client['full_seq'] is not None and seq < client['full_seq']:
+                    return
+                if client['acked_seq'] is None or seq > client['acked_seq']:
+                    client['acked_seq'] = seq
+                self.trace_acked_inputs(client, seq, time.monotonic())
 
         elif message['type'] == 'restart':
             # Обработка запроса на перезапуск игрока
-            # Если игрок не существует или был удален при смерти
-            if player_id not in room.players:
-                # Создаем нового игрока
-                x = random.randint(50, SCREEN_WIDTH - 50)
-                y = SCREEN_HEIGHT - 100
-                new_player = Player(player_id, x, y)
-                room.players[player_id] = new_player
-
-                # Отправляем подтверждение о успешном перезапуске
-                self.send_data(self.clients[player_id]['socket'], {
-                    'type': 'restart_success'
-                })
+            created = room.restart_player(player_id)
+
+            # Отправляем подтверждение о успешном перезапуске
+            self.send_to_player(player_id, {
+                'type': 'restart_success'
+            })
+            if created:
                 print(
                     f"[SERVER] Игрок {player_id} перезапущен в комнате {room_id}")
             else:
-                # Если игрок существует, но выиграл или имеет низкое здоровье
-                # Сбрасываем его состояние
-                player.health = 100
-                player.score = 0
-                player.x = random.randint(50, SCREEN_WIDTH - 50)
-                player.y = SCREEN_HEIGHT - 100
-                player.vel_x = 0
-                player.vel_y = 0
-
-                # Отправляем подтверждение о успешном перезапуске
-                self.send_data(self.clients[player_id]['socket'], {
-                    'type': 'restart_success'
-                })
                 print(
                     f"[SERVER] Состояние игрока {player_id} сброшено в комнате {room_id}")
 
@@ -702,52 +463,190 @@ class Server:
 
             new_room_id = message.get('room_id')
             if new_room_id is not None and new_room_id in self.rooms:
-                if player_id in room.players:
-                    del room.players[player_id]
-                if player_id in room.clients:
-                    del room.clients[player_id]
+                room.remove_player(player_id)
 
                 self.clients[player_id]['room_id'] = new_room_id
-                self.rooms[new_room_id].players[player_id] = player
+                # В новой комнате своя нумерация снимков - базы больше нет
+                self.clients[player_id]['acked_seq'] = None
+                self.clients[player_id]['full_seq'] = None
+                self.clients[player_id]['awaiting_ack'].clear()
+                self.rooms[new_room_id].add_player(player_id, player)
                 self.rooms[new_room_id].clients[player_id] = self.clients[player_id]['socket']
                 print(
                     f"[SERVER] Игрок {player_id} перешел в комнату {new_room_id}")
 
     def update_loop(self):
-        while True:
-            for room_id, room in list(self.rooms.items()):
-                # Обновляем состояние комнаты и передаем ссылку на сервер
-                room.update(self)
-
-                # Отправляем состояние комнаты всем игрокам
-                room_data = room.to_dict()
-                for player_id in list(room.players.keys()):
-                    if player_id in self.clients:
-                        try:
-                            self.send_data(self.clients[player_id]['socket'], {
-                                'type': 'state',
-                                'room': room_data
-                            })
-                        except Exception as e:
-                            print(
-                                f"[SERVER] Ошибка при отправке состояния игроку {player_id}: {e}")
-
-            pygame.time.delay(33)  # ~30 FPS
-
-    def send_data(self, client_socket, data):
+        self.scheduler.run(self.tick)
+
+    def tick(self, steps=1):
+        """Выполняет steps шагов симуляции; при отставании планировщик
+        просит несколько шагов, а снимок отправляется один раз"""
+        started = time.perf_counter()
+        self.tick_lateness.observe(self.scheduler.lateness)
+        self.profiler.begin_tick()
+        for room_id, room in list(self.rooms.items()):
+            with self.rooms_lock:
+                # Комнату могли удалить после снятия списка
+                if self.rooms.get(room_id) is not room:
+                    continue
+                with self.profiler.section(room_id):
+                    # Обновляем состояние комнаты и передаем ссылку на сервер
+                    with Timer(self.room_update_time, room=room_id):
+                        for _ in range(steps):
+                            room.update(self)
+
+                    # Отправляем состояние комнаты всем игрокам
+                    self.broadcast_state(room)
+
+        self.report_stats()
+        self.profiler.end_tick()
+        self.tick_time.observe(time.perf_counter() - started)
+
+    def report_stats(self):
+        now = time.monotonic()
+        if now - self.last_scheduler_report < SCHEDULER_REPORT_INTERVAL:
+            return
+        self.last_scheduler_report = now
+        self.report_scheduler()
+        self.report_level_pool()
+
+    def report_scheduler(self):
+        stats = self.scheduler.stats()
+        if (stats['overruns'] == self.reported_overruns and
+                stats['skipped_ticks'] == self.reported_skipped):
+            return
+        print(f"[SERVER] Перегрузка тиков: частота {stats['achieved_rate']:.1f}/{stats['tick_rate']}, "
+              f"перегрузок {stats['overruns'] - self.reported_overruns}, "
+              f"пропущено шагов {stats['skipped_ticks'] - self.reported_skipped}, "
+              f"макс. длительность {stats['max_duration'] * 1000:.1f} мс")
+        self.reported_overruns = stats['overruns']
+        self.reported_skipped = stats['skipped_ticks']
+
+    def report_level_pool(self):
+        stats = self.level_pool.stats()
+        if stats['taken'] == self.reported_levels_taken:
+            return
+        print(f"[SERVER] Пул уровней: готово {stats['depth']}/{stats['capacity']}, "
+              f"взято {stats['taken'] - self.reported_levels_taken}, "
+              f"собрано на месте {stats['misses']}, "
+              f"пополнение {stats['refill_rate']:.2f} ур./с")
+        self.reported_levels_taken = stats['taken']
+
+    def broadcast_state(self, room):
+        """Раздает снимок комнаты игрокам: дельту относительно подтвержденного
+        клиентом снимка или полный снимок, если базы нет.
+
+        Каждый кадр кодируется один раз на пару (база, формат) и ставится
+        в очереди соединений, поэтому медленный клиент не задерживает тик.
+        """
+        with Timer(self.serialize_time, kind='state'):
+            state = room_state(room)
+        seq = room.history.push(state)
+        now = time.monotonic()
+        frames = {}
+        # Игрок берется вместе с id: в режиме threads его могут удалить
+        # из комнаты, пока кадр уходит в очередь
+        for player_id, player in list(room.players.items()):
+            client = self.clients.get(player_id)
+            if client is None:
+                continue
+            try:
+                base_seq = client['acked_seq']
+                if not room.history.has(base_seq):
+                    base_seq = client['full_seq']
+                if not room.history.has(base_seq):
+                    base_seq = None
+                    client['acked_seq'] = None
+                    client['full_seq'] = seq
+
+                key = (base_seq, client['format'])
+                frame = frames.get(key)
+                if frame is None:
+                    with Timer(self.serialize_time, kind='snapshot'):
+                        frame = encode_message(
+                            self.snapshot_message(room, state, seq, base_seq), client['format'])
+                    frames[key] = frame
+
+                # Полный снимок не выбрасывается: на нем строятся следующие дельты
+                client['connection'].enqueue(frame, droppable=base_seq is not None)
+                self.count_traffic(player_id, 'out', len(frame))
+                self.trace_applied_inputs(client, player, seq, now)
+            except Exception as e:
+                self.send_failures.inc(kind='state')
+                print(
+                    f"[SERVER] Ошибка при отправке состояния игроку {player_id}: {e}")
+
+    def snapshot_message(self, room, state, seq, base_seq):
+        if base_seq is not None:
+            return {
+                'type': 'delta',
+                'room_id': room.id,
+                'seq': seq,
+                'base': base_seq,
+                **room.history.delta_from(base_seq)
+            }
+        # Полный снимок строится из того же состояния,
+        # что сохранено в истории как база для дельт
+        return {
+            'type': 'state',
+            'seq': seq,
+            'room': {
+                'id': room.id,
+                'players': state['players'],
+                'bullets': list(state['bullets'].values()),
+                'platforms': [platform.to_dict() for platform in room.platforms]
+            }
+        }
+
+    def send_to_player(self, player_id, data):
+        client = self.clients.get(player_id)
+        if client:
+            size = self.send_data(client['connection'], data, client['format'])
+            if size:
+                self.count_traffic(player_id, 'out', size)
+
+    def send_data(self, connection, data, fmt=FORMAT_JSON):
+        """Ставит сообщение в очередь; возвращает размер кадра или None при ошибке"""
         try:
-            message = json.dumps(data).encode('utf-8')
-            # Добавляем заголовок с длиной сообщения (4 байта)
-            header = len(message).to_bytes(4, byteorder='big')
-            client_socket.sendall(header + message)
+            # Кадр уже содержит заголовок с длиной сообщения (4 байта)
+            with Timer(self.serialize_time, kind='message'):
+                frame = encode_message(data, fmt)
+            connection.enqueue(frame)
+            return len(frame)
         except Exception as e:
+            self.send_failures.inc(kind='message')
             print(f"[SERVER] Ошибка при отправке данных: {e}")
+            return None
 
 
 def run_server():
-    pygame.init()  # Инициализируем pygame для расчетов
-    server = Server(SERVER_IP, PORT)
-    server.start()
+    parser = argparse.ArgumentParser(description="Сервер игры")
+    parser.add_argument("--mode", choices=[NETWORK_THREADS, NETWORK_EVENT_LOOP],
+                        default=NETWORK_THREADS,
+                        help="поток на клиента или один цикл событий на все сокеты")
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE,
+                        help="шагов симуляции в секунду (физика задана на один шаг)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="распределить комнаты по N процессам (0 - без шардирования, "
+                             "-1 - по числу ядер); фронт работает в режиме event")
+    parser.add_argument("--record", metavar="DIR",
+                        help="записывать журналы комнат для replay.py в каталог DIR")
+    parser.add_argument("--seed", type=int,
+                        help="зерно для уровней и зерен комнат (по умолчанию случайное)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="отдавать метрики по HTTP на 127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+    if args.workers:
+        from sharding import ShardedServer, default_worker_count
+        workers = default_worker_count() if args.workers < 0 else args.workers
+        server = ShardedServer(SERVER_IP, PORT, args.tick_rate, workers,
+                               args.record, args.seed)
+    else:
+        server = Server(SERVER_IP, PORT, args.tick_rate, args.record, args.seed)
+    if args.metrics_port:
+        serve_metrics(server.metrics, args.metrics_port,
+                      {'/profile': server.request_profile})
+    server.start(args.mode)
 
 
 if __name__ == "__main__":
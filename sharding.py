@@ -0,0 +1,385 @@
+"""Шардирование комнат по процессам-воркерам.
+
+Фронтальный процесс принимает соединения, выбирает комнату и пересылает
+сообщения игроков воркеру, которому принадлежит комната. Каждый воркер сам
+обновляет свои комнаты по расписанию и возвращает фронту готовые кадры
+снимков и событий, которые тот раскладывает по очередям соединений.
+"""
+import multiprocessing
+import os
+import queue
+import selectors
+import signal
+import threading
+import time
+
+from core import MAX_PLAYERS, Player
+from server import NETWORK_EVENT_LOOP, Server
+from connection import Connection
+from protocol import FORMATS, FORMAT_JSON
+
+# Как часто воркер присылает фронту снимок своих метрик, секунд
+METRICS_PUSH_INTERVAL = 1.0
+
+
+def default_worker_count():
+    return os.cpu_count() or 1
+
+
+class PipeWriter:
+    """Отправка в канал из отдельного потока.
+
+    Connection.send блокируется, когда буфер канала полон. Если фронт и
+    воркер одновременно ждут друг друга на записи, ни один не дочитает
+    канал, и оба зависнут навсегда. Поэтому оба пишут только в очередь,
+    а в канал ее выгружает фоновый поток; чтение идет как раньше.
+    """
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def send(self, item):
+        self.queue.put(item)
+
+    def write_loop(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self.pipe.send(item)
+            except (BrokenPipeError, EOFError, OSError):
+                return  # Другая сторона завершилась
+
+
+class OutboxConnection:
+    """Соединение внутри воркера: кадры копятся и уходят фронту пачкой после тика"""
+
+    def __init__(self, player_id, outbox):
+        self.player_id = player_id
+        self.outbox = outbox
+
+    def enqueue(self, frame, droppable=False):
+        self.outbox.append(('frame', self.player_id, frame, droppable))
+
+    def flush(self):
+        return False
+
+    def has_pending(self):
+        return False
+
+
+class RoomWorker(Server):
+    """Процесс, владеющий частью комнат: та же логика Server, но без сокетов"""
+
+    def __init__(self, pipe, tick_rate, record_dir=None, seed=None):
+        super().__init__(None, None, tick_rate, record_dir, seed)
+        self.pipe = pipe
+        self.writer = None
+        self.outbox = []
+        self.next_metrics_push = 0.0
+
+    def run(self):
+        # Воркер профилируется сигналом напрямую: kill -USR1 <pid воркера>
+        self.profiler.install_signal()
+        self.writer = PipeWriter(self.pipe)
+        while True:
+            if self.pipe.poll(self.scheduler.time_until_next()):
+                while self.pipe.poll():
+                    self.handle_command(self.pipe.recv())
+
+            steps = self.scheduler.due_ticks()
+            if steps:
+                started = time.monotonic()
+                self.tick(steps)
+                self.scheduler.record_duration(time.monotonic() - started)
+
+            # Своего порта метрик у воркера нет: их отдает фронт с меткой worker
+            now = time.monotonic()
+            if now >= self.next_metrics_push:
+                self.next_metrics_push = now + METRICS_PUSH_INTERVAL
+                self.outbox.append(('metrics', self.metrics.collect()))
+
+            if self.outbox:
+                # Список общий с OutboxConnection, поэтому в очередь уходит
+                # копия, а он сам очищается на месте
+                self.writer.send(self.outbox[:])
+                self.outbox.clear()
+
+    def register_connection_metrics(self):
+        # Сокеты и трафик клиентов видит только фронт
+        pass
+
+    def count_traffic(self, player_id, direction, size, messages=1):
+        pass
+
+    def handle_command(self, command):
+        name = command[0]
+        if name == 'create_room':
+            self.ensure_room(command[1])
+        elif name == 'join':
+            _, player_id, room_id, player_data, player_command, fmt = command
+            self.join_player(player_id, room_id, player_data, player_command, fmt)
+        elif name == 'message':
+            _, player_id, message = command
+            self.process_client_message(player_id, message)
+        elif name == 'leave':
+            self.detach_player(command[1])
+        elif name == 'profile':
+            self.profiler.request(command[1])
+
+    def ensure_room(self, room_id):
+        # Фронт мог направить игрока в комнату, которую воркер уже удалил
+        # как опустевшую - тогда создаем ее заново с тем же номером
+        if room_id not in self.rooms:
+            self.rooms[room_id] = self.new_room(room_id)
+            print(f"[WORKER {os.getpid()}] Создана комната {room_id}")
+        return self.rooms[room_id]
+
+    def join_player(self, player_id, room_id, player_data, player_command, fmt):
+        room = self.ensure_room(room_id)
+        if player_data is None:
+            room.add_player(player_id)
+        else:
+            # Удерживаемый ввод переходит вместе с игроком: клиент не
+            # пришлет его заново, пока не изменит
+            player = Player.from_dict(player_data)
+            player.command = player_command
+            room.add_player(player_id, player)
+        room.clients[player_id] = None
+        self.clients[player_id] = {
+            'socket': None,
+            'connection': OutboxConnection(player_id, self.outbox),
+            'room_id': room_id,
+            'acked_seq': None,
+            'full_seq': None,
+            'format': fmt,
+            **self.new_input_trace()
+        }
+
+    def process_client_message(self, player_id, message):
+        if message['type'] == 'change_room':
+            self.change_room(player_id, message.get('room_id'))
+            return
+        super().process_client_message(player_id, message)
+
+    def change_room(self, player_id, new_room_id):
+        client = self.clients.get(player_id)
+        room = self.rooms.get(client['room_id']) if client else None
+        player = room.players.get(player_id) if room else None
+        if not player or new_room_id == client['room_id']:
+            return
+
+        if new_room_id in self.rooms:
+            super().process_client_message(
+                player_id, {'type': 'change_room', 'room_id': new_room_id})
+            self.outbox.append(('moved', player_id, new_room_id))
+        else:
+            # Комната на другом воркере - отдаем игрока фронту для переноса
+            fmt = client['format']
+            self.detach_player(player_id)
+            self.outbox.append(
+                ('migrate', player_id, new_room_id, player.to_dict(), player.command, fmt))
+
+
+def run_worker(pipe, tick_rate, record_dir, seed):
+    try:
+        RoomWorker(pipe, tick_rate, record_dir, seed).run()
+    except (KeyboardInterrupt, EOFError):
+        pass
+
+
+class WorkerHandle:
+    def __init__(self, index, tick_rate, record_dir, seed):
+        self.index = index
+        self.pipe, child_pipe = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=run_worker, args=(child_pipe, tick_rate, record_dir, seed), daemon=True)
+        self.rooms = set()
+        self.writer = None
+
+    def start(self):
+        self.process.start()
+        # Команды шлют цикл фронта и поток HTTP метрик; в канал пишет
+        # только поток PipeWriter, и цикл событий на нем не блокируется
+        self.writer = PipeWriter(self.pipe)
+
+    def send(self, *command):
+        self.writer.send(command)
+
+
+class ShardedServer(Server):
+    """Фронтальный процесс: сокеты и маршрутизация, комнаты живут в воркерах"""
+
+    def __init__(self, host, port, tick_rate, workers, record_dir=None, seed=None):
+        super().__init__(host, port, tick_rate, record_dir, seed)
+        # Каждый воркер получает свое зерно от общего генератора фронта
+        self.workers = [WorkerHandle(index, tick_rate, record_dir, self.rng.getrandbits(32))
+                        for index in range(workers)]
+        # Комната -> воркер и состав комнаты с точки зрения фронта
+        self.room_workers = {}
+        self.room_players = {}
+
+    def start(self, mode=NETWORK_EVENT_LOOP):
+        for worker in self.workers:
+            worker.start()
+        print(f"[SERVER] Запущено воркеров комнат: {len(self.workers)}")
+        # Фронт всегда работает в однопоточном цикле событий
+        super().start(NETWORK_EVENT_LOOP)
+
+    def register_room_metrics(self):
+        # Комнаты и тики живут в воркерах: их величины приходят снимками
+        # реестров воркеров и отдаются с меткой worker
+        pass
+
+    def install_profile_signal(self):
+        # Фронт не обновляет комнат, поэтому SIGUSR1 передается воркерам
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.signal_workers())
+
+    def signal_workers(self):
+        for worker in self.workers:
+            os.kill(worker.process.pid, signal.SIGUSR1)
+
+    def request_profile(self, query):
+        """Команда /profile на фронте: профиль снимают воркеры, владеющие комнатами"""
+        ticks = self.profile_ticks(query)
+        for worker in self.workers:
+            worker.send('profile', ticks)
+        pids = ", ".join(str(worker.process.pid) for worker in self.workers)
+        return (f"профиль следующих {ticks} тиков запрошен у воркеров {pids}, "
+                f"файлы будут записаны в {self.profiler.directory}")
+
+    def run_event_loop(self):
+        selector = selectors.DefaultSelector()
+        self.server_socket.setblocking(False)
+        selector.register(self.server_socket, selectors.EVENT_READ)
+        for worker in self.workers:
+            selector.register(worker.pipe, selectors.EVENT_READ, worker)
+
+        while True:
+            for key, events in selector.select():
+                if key.fileobj is self.server_socket:
+                    self.accept_event_client(selector)
+                elif isinstance(key.data, WorkerHandle):
+                    self.drain_worker(key.data)
+                else:
+                    self.handle_client_events(selector, key, events)
+
+            self.update_write_interest(selector)
+
+    def drain_worker(self, worker):
+        while worker.pipe.poll():
+            for item in worker.pipe.recv():
+                if item[0] == 'frame':
+                    _, player_id, frame, droppable = item
+                    client = self.clients.get(player_id)
+                    if client:
+                        try:
+                            client['connection'].enqueue(frame, droppable)
+                            self.count_traffic(player_id, 'out', len(frame))
+                        except Exception as e:
+                            self.send_failures.inc(kind='state' if droppable else 'message')
+                            print(
+                                f"[SERVER] Ошибка при отправке данных игроку {player_id}: {e}")
+                elif item[0] == 'metrics':
+                    self.metrics.update_remote({'worker': worker.index}, item[1])
+                elif item[0] == 'moved':
+                    _, player_id, room_id = item
+                    if player_id in self.clients and room_id in self.room_workers:
+                        self.move_player(player_id, room_id)
+                elif item[0] == 'migrate':
+                    _, player_id, room_id, player_data, player_command, fmt = item
+                    if player_id not in self.clients:
+                        continue
+                    if room_id not in self.room_workers:
+                        # Целевая комната успела опустеть - возвращаем игрока
+                        room_id = self.clients[player_id]['room_id']
+                    else:
+                        self.move_player(player_id, room_id)
+                    self.workers[self.room_workers[room_id]].send(
+                        'join', player_id, room_id, player_data, player_command, fmt)
+
+    def create_room(self):
+        room_id = self.next_room_id
+        self.next_room_id += 1
+        worker = min(self.workers, key=lambda w: len(w.rooms))
+        worker.rooms.add(room_id)
+        worker.send('create_room', room_id)
+        self.room_workers[room_id] = worker.index
+        self.room_players[room_id] = set()
+        print(f"[SERVER] Создана комната {room_id} в воркере {worker.index}")
+        return room_id
+
+    def delete_room_if_empty(self, room_id):
+        if room_id in self.room_players and not self.room_players[room_id]:
+            del self.room_players[room_id]
+            self.workers[self.room_workers.pop(room_id)].rooms.discard(room_id)
+
+    def move_player(self, player_id, room_id):
+        old_room_id = self.clients[player_id]['room_id']
+        self.room_players[old_room_id].discard(player_id)
+        self.delete_room_if_empty(old_room_id)
+        self.room_players[room_id].add(player_id)
+        self.clients[player_id]['room_id'] = room_id
+
+    def add_client(self, client_socket, address):
+        player_id = self.next_player_id
+        self.next_player_id += 1
+
+        room_id = None
+        for rid, players in self.room_players.items():
+            if len(players) < MAX_PLAYERS:
+                room_id = rid
+                break
+        if room_id is None:
+            room_id = self.create_room()
+        self.room_players[room_id].add(player_id)
+
+        connection = Connection(client_socket)
+        self.clients[player_id] = {
+            'socket': client_socket,
+            'connection': connection,
+            'room_id': room_id,
+            'format': FORMAT_JSON,
+            'address': address,
+            'buffer': b''
+        }
+        self.workers[self.room_workers[room_id]].send(
+            'join', player_id, room_id, None, None, FORMAT_JSON)
+
+        size = self.send_data(connection, {
+            'type': 'init',
+            'player_id': player_id,
+            'room_id': room_id,
+            'formats': list(FORMATS),
+            'tick_rate': self.scheduler.tick_rate
+        })
+        if size:
+            self.count_traffic(player_id, 'out', size)
+        return player_id
+
+    def process_client_message(self, player_id, message):
+        client = self.clients.get(player_id)
+        if client is None:
+            return
+        if message['type'] == 'ping':
+            # Pong отвечает фронт: RTT не должен включать пересылку воркеру
+            self.send_to_player(player_id, {'type': 'pong', 't': message['t']})
+            return
+        if message['type'] == 'change_room' and message.get('room_id') not in self.room_workers:
+            return
+        self.workers[self.room_workers[client['room_id']]].send(
+            'message', player_id, message)
+
+    def detach_player(self, player_id):
+        client = self.clients.pop(player_id, None)
+        if client is None:
+            return
+        room_id = client['room_id']
+        self.workers[self.room_workers[room_id]].send('leave', player_id)
+        self.room_players[room_id].discard(player_id)
+        self.metrics.remove(player=player_id)
+        print(f"[SERVER] Игрок {player_id} покинул комнату {room_id}")
+        self.delete_room_if_empty(room_id)
@@ -0,0 +1,88 @@
+"""Дельта-кодирование снимков комнаты относительно подтвержденного клиентом базового снимка"""
+
+# Сколько последних снимков хранится для построения дельт (~1 секунда при 30 тиках)
+HISTORY_SIZE = 32
+
+# Типы сущностей, которые меняются от тика к тику (платформы статичны
+# и передаются только в полном снимке)
+ENTITY_KINDS = ('players', 'bullets')
+
+
+def room_state(room):
+    """Снимает состояние динамических сущностей комнаты в виде словарей по id"""
+    return {
+        'players': {player_id: player.to_dict() for player_id, player in room.players.items()},
+        'bullets': room.bullets.snapshot()
+    }
+
+
+def diff_states(base, current):
+    """Возвращает только те поля сущностей, которые изменились относительно base"""
+    delta = {}
+    for kind in ENTITY_KINDS:
+        old_entities = base[kind]
+        changed = {}
+        for entity_id, fields in current[kind].items():
+            old_fields = old_entities.get(entity_id)
+            if old_fields is None:
+                changed[entity_id] = fields
+                continue
+            changed_fields = {key: value for key, value in fields.items()
+                              if old_fields.get(key) != value}
+            if changed_fields:
+                changed[entity_id] = changed_fields
+        delta[kind] = changed
+        delta[kind + '_removed'] = [entity_id for entity_id in old_entities
+                                    if entity_id not in current[kind]]
+    return delta
+
+
+def apply_delta(base, delta):
+    """Собирает новое состояние из базового снимка и дельты.
+
+    Ключи приводятся к int, так как после JSON они приходят строками.
+    """
+    state = {}
+    for kind in ENTITY_KINDS:
+        entities = {entity_id: dict(fields)
+                    for entity_id, fields in base[kind].items()}
+        for entity_id in delta.get(kind + '_removed', []):
+            entities.pop(int(entity_id), None)
+        for entity_id, fields in delta.get(kind, {}).items():
+            entities.setdefault(int(entity_id), {}).update(fields)
+        state[kind] = entities
+    return state
+
+
+def normalize_state(state):
+    """Приводит ключи сущностей полного снимка к int"""
+    return {kind: {int(entity_id): fields for entity_id, fields in state[kind].items()}
+            for kind in ENTITY_KINDS}
+
+
+class SnapshotHistory:
+    """Кольцевая история снимков одной комнаты с кэшем дельт текущего тика"""
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.size = size
+        self.seq = 0
+        self.states = {}
+        self.delta_cache = {}
+
+    def push(self, state):
+        self.seq += 1
+        self.states[self.seq] = state
+        self.states.pop(self.seq - self.size, None)
+        self.delta_cache = {}
+        return self.seq
+
+    def has(self, seq):
+        return seq is not None and seq in self.states
+
+    def delta_from(self, base_seq):
+        """Дельта текущего снимка относительно base_seq, общая для всех клиентов с этой базой"""
+        delta = self.delta_cache.get(base_seq)
+        if delta is None:
+            delta = diff_states(self.states[base_seq], self.states[self.seq])
+            self.delta_cache[base_seq] = delta
+        return delta
@@ -0,0 +1,45 @@
+"""Пространственный хэш (равномерная сетка) для широкой фазы столкновений"""
+
+CELL_SIZE = 64
+
+
+class SpatialHash:
+    """Ячейка сетки -> объекты, чьи прямоугольники ее задевают.
+
+    Запрос возвращает кандидатов в порядке добавления, поэтому результат
+    проверок совпадает с полным перебором исходного списка.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.count = 0
+
+    def _cell_range(self, rect):
+        size = self.cell_size
+        # Нижняя и правая границы включаются: касание края тоже проверяется
+        return (rect.left // size, rect.right // size,
+                rect.top // size, rect.bottom // size)
+
+    def insert(self, item, rect):
+        entry = (self.count, item)
+        self.count += 1
+        left, right, top, bottom = self._cell_range(rect)
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                self.cells.setdefault((cx, cy), []).append(entry)
+
+    def clear(self):
+        self.cells.clear()
+        self.count = 0
+
+    def query(self, rect):
+        left, right, top, bottom = self._cell_range(rect)
+        if left == right and top == bottom:
+            return [item for _, item in self.cells.get((left, top), ())]
+        found = {}
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                for index, item in self.cells.get((cx, cy), ()):
+                    found[index] = item
+        return [found[index] for index in sorted(found)]
@@ -0,0 +1,295 @@
+"""Генератор нагрузки: рой ботов на asyncio в одном процессе.
+
+Каждый бот - отдельное TCP-соединение, говорящее тем же протоколом, что и
+client.py: кадры с заголовком длины, рукопожатие `init` с выбором формата,
+вводы с номером шага (только при смене и раз в INPUT_HEARTBEAT_TICKS),
+подтверждения снимков и перезапуск после смерти или конца раунда. Ввод
+случайный или берется из сценария. Для каждого соединения считаются
+частота снимков, разброс интервалов между ними и время декодирования:
+
+    python swarm.py --bots 2000 --duration 60 --output swarm.json
+
+Сценарий - JSON-список шагов, повторяемый по кругу:
+
+    [{"ticks": 30, "right": true}, {"ticks": 5, "jump": true, "shoot": true,
+      "mouse_x": 400, "mouse_y": 100}]
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from bots import InputPolicy, RandomInput
+from metrics import percentile
+from protocol import FORMAT_BINARY, FORMAT_JSON, FORMATS, HEADER_SIZE, decode_message, encode_message
+from scheduler import TICK_RATE
+
+PORT = 5555
+# Пауза перед перезапуском после смерти или победы, с
+RESTART_DELAY = 1.0
+# Сколько соединений открывается в секунду при разгоне роя
+CONNECT_RATE = 200
+# Сколько последних интервалов и замеров декодирования хранит соединение
+STAT_SAMPLES = 1024
+
+
+def raise_file_limit():
+    """Поднимает мягкий лимит дескрипторов до жесткого - на тысячи сокетов"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+class ScriptedInput:
+    """Ввод по сценарию: шаги по "ticks" тиков каждый, по кругу"""
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.index = 0
+        self.left = steps[0].get('ticks', 1)
+
+    def next(self, rng):
+        step = self.steps[self.index]
+        self.left -= 1
+        if self.left <= 0:
+            self.index = (self.index + 1) % len(self.steps)
+            self.left = self.steps[self.index].get('ticks', 1)
+        return {name: value for name, value in step.items() if name != 'ticks'}
+
+
+class SwarmBot:
+    """Одно соединение роя: прием снимков с замерами и отправка ввода"""
+
+    def __init__(self, index, inputs, rng, wire_format=FORMAT_BINARY):
+        self.index = index
+        self.policy = InputPolicy(inputs, rng)
+        self.wire_format = wire_format
+        self.format = None
+        self.writer = None
+        self.player_id = None
+        self.restart_at = None
+
+        self.connected_at = None
+        self.closed_at = None
+        self.error = None
+        self.snapshots = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.last_snapshot_at = None
+        self.intervals = deque(maxlen=STAT_SAMPLES)
+        self.decode_times = deque(maxlen=STAT_SAMPLES)
+
+    def send_message(self, message):
+        if self.writer is None or self.writer.is_closing():
+            return
+        data = encode_message(message, self.format or FORMAT_JSON)
+        self.writer.write(data)
+        self.messages_out += 1
+        self.bytes_out += len(data)
+
+    async def run(self, host, port, finish):
+        try:
+            reader, self.writer = await asyncio.open_connection(host, port)
+        except OSError as e:
+            self.error = str(e)
+            return
+        # Как у клиента: мелкие кадры ввода уходят без задержки Нейгла
+        self.writer.get_extra_info('socket').setsockopt(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connected_at = time.monotonic()
+        try:
+            await asyncio.wait_for(self.receive_loop(reader), finish - time.monotonic())
+        except asyncio.TimeoutError:
+            pass
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            self.closed_at = time.monotonic()
+            self.writer.close()
+
+    async def receive_loop(self, reader):
+        while True:
+            header = await reader.readexactly(HEADER_SIZE)
+            payload = await reader.readexactly(int.from_bytes(header, byteorder='big'))
+            received_at = time.monotonic()
+            started = time.perf_counter()
+            message = decode_message(payload)
+            self.decode_times.append(time.perf_counter() - started)
+            self.messages_in += 1
+            self.bytes_in += HEADER_SIZE + len(payload)
+            self.process_server_message(message, received_at)
+
+    def process_server_message(self, message, received_at):
+        kind = message['type']
+        if kind == 'init':
+            self.player_id = message['player_id']
+            if self.wire_format in message.get('formats', []):
+                self.send_message({'type': 'init', 'format': self.wire_format})
+                self.format = self.wire_format
+        elif kind in ('state', 'delta'):
+            self.snapshots += 1
+            if self.last_snapshot_at is not None:
+                self.intervals.append(received_at - self.last_snapshot_at)
+            self.last_snapshot_at = received_at
+            room_id = message['room']['id'] if kind == 'state' else message['room_id']
+            self.send_message({'type': 'ack', 'room_id': room_id, 'seq': message['seq']})
+        elif kind == 'winner' or (kind == 'death' and message['player_id'] == self.player_id):
+            if self.restart_at is None:
+                self.restart_at = received_at + RESTART_DELAY
+
+    def step(self, now):
+        """Шаг с частотой тиков: новый номер ввода, отправка при смене"""
+        if self.player_id is None or self.closed_at is not None:
+            return
+        if self.restart_at is not None and now >= self.restart_at:
+            self.restart_at = None
+            self.send_message({'type': 'restart'})
+
+        message = self.policy.step(now)
+        if message is not None:
+            self.send_message(message)
+
+    def stats(self):
+        end = self.closed_at or time.monotonic()
+        alive = end - self.connected_at if self.connected_at else 0.0
+        intervals = list(self.intervals)
+        mean = sum(intervals) / len(intervals) if intervals else 0.0
+        jitter = (sum((interval - mean) ** 2 for interval in intervals) / len(intervals)) ** 0.5 \
+            if intervals else 0.0
+        return {
+            'bot': self.index,
+            'player_id': self.player_id,
+            'error': self.error,
+            'seconds': alive,
+            'snapshot_rate': self.snapshots / alive if alive > 0 else 0.0,
+            'jitter_ms': jitter * 1000,
+            'interval_p99_ms': percentile(intervals, 0.99) * 1000,
+            'decode_us_mean': (sum(self.decode_times) / len(self.decode_times) * 1e6
+                               if self.decode_times else 0.0),
+            'decode_us_p99': percentile(self.decode_times, 0.99) * 1e6,
+            'messages_in': self.messages_in,
+            'messages_out': self.messages_out,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out
+        }
+
+
+class Swarm:
+    """Рой ботов: постепенное подключение и общий таймер шагов ввода"""
+
+    def __init__(self, host, port, bots, script=None, wire_format=FORMAT_BINARY,
+                 tick_rate=TICK_RATE, seed=None):
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        rng = random.Random(seed)
+        self.bots = []
+        for index in range(bots):
+            inputs = ScriptedInput(script) if script else RandomInput(tick_rate)
+            self.bots.append(SwarmBot(index, inputs, random.Random(rng.getrandbits(32)),
+                                      wire_format))
+
+    async def run(self, duration, connect_rate=CONNECT_RATE):
+        finish = time.monotonic() + duration
+        ticker = asyncio.ensure_future(self.drive_inputs(finish))
+        tasks = []
+        for bot in self.bots:
+            tasks.append(asyncio.ensure_future(bot.run(self.host, self.port, finish)))
+            await asyncio.sleep(1 / connect_rate)
+        await asyncio.gather(*tasks)
+        await ticker
+
+    async def drive_inputs(self, finish):
+        # Один таймер на весь рой: тысячи отдельных sleep дороже самих шагов
+        interval = 1 / self.tick_rate
+        next_step = time.monotonic()
+        while next_step < finish:
+            now = time.monotonic()
+            for bot in self.bots:
+                bot.step(now)
+            next_step += interval
+            await asyncio.sleep(max(0.0, next_step - time.monotonic()))
+
+    def report(self):
+        per_bot = [bot.stats() for bot in self.bots]
+        alive = [stats for stats in per_bot if stats['seconds'] > 0]
+        rates = [stats['snapshot_rate'] for stats in alive]
+        jitters = [stats['jitter_ms'] for stats in alive]
+        decode = [value * 1e6 for bot in self.bots for value in bot.decode_times]
+        seconds = sum(stats['seconds'] for stats in alive) or 1.0
+        return {
+            'bots': len(self.bots),
+            'connected': len(alive),
+            'errors': sum(1 for stats in per_bot if stats['error']),
+            # Соединение открыто, но сервер так и не прислал init
+            'no_init': sum(1 for stats in alive if stats['player_id'] is None),
+            'snapshot_rate': {'p50': percentile(rates, 0.5), 'min': min(rates, default=0.0),
+                              'p1': percentile(rates, 0.01)},
+            'jitter_ms': {'p50': percentile(jitters, 0.5), 'p99': percentile(jitters, 0.99)},
+            'decode_us': {'p50': percentile(decode, 0.5), 'p99': percentile(decode, 0.99)},
+            'bytes_in_per_bot_per_s': sum(stats['bytes_in'] for stats in alive) / seconds,
+            'bytes_out_per_bot_per_s': sum(stats['bytes_out'] for stats in alive) / seconds,
+            'connections': per_bot
+        }
+
+
+def run_swarm():
+    parser = argparse.ArgumentParser(description="Рой ботов для нагрузки на сервер")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--bots", type=int, default=100, help="число соединений")
+    parser.add_argument("--duration", type=float, default=30, help="длительность, с")
+    parser.add_argument("--connect-rate", type=float, default=CONNECT_RATE,
+                        help="подключений в секунду")
+    parser.add_argument("--format", choices=FORMATS, default=FORMAT_BINARY)
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE)
+    parser.add_argument("--script", help="JSON-сценарий ввода вместо случайного")
+    parser.add_argument("--seed", type=int, help="зерно случайного ввода")
+    parser.add_argument("--output", help="сохранить отчет по соединениям в JSON")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, encoding='utf-8') as script_file:
+            script = json.load(script_file)
+    raise_file_limit()
+    swarm = Swarm(args.host, args.port, args.bots, script, args.format,
+                  args.tick_rate, args.seed)
+    try:
+        asyncio.run(swarm.run(args.duration, args.connect_rate))
+    except KeyboardInterrupt:
+        pass
+
+    report = swarm.report()
+    rate, jitter, decode = report['snapshot_rate'], report['jitter_ms'], report['decode_us']
+    print(f"[SWARM] Подключено {report['connected']}/{report['bots']}, "
+          f"без init {report['no_init']}, ошибок {report['errors']}")
+    print(f"[SWARM] Снимков в секунду: медиана {rate['p50']:.1f}, "
+          f"1-й перцентиль {rate['p1']:.1f}, минимум {rate['min']:.1f}")
+    print(f"[SWARM] Разброс интервалов: медиана {jitter['p50']:.1f} мс, "
+          f"p99 {jitter['p99']:.1f} мс")
+    print(f"[SWARM] Декодирование: медиана {decode['p50']:.1f} мкс, p99 {decode['p99']:.1f} мкс")
+    print(f"[SWARM] На бота: принято {report['bytes_in_per_bot_per_s'] / 1024:.1f} КБ/с, "
+          f"отправлено {report['bytes_out_per_bot_per_s']:.0f} Б/с")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    run_swarm()
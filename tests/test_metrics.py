@@ -0,0 +1,60 @@
+import pickle
+
+from metrics import MetricsRegistry
+from sharding import RoomWorker
+
+
+def worker_registry(players):
+    registry = MetricsRegistry()
+    registry.gauge('players_active', "Живые игроки", lambda: players)
+    lateness = registry.histogram('tick_lateness_seconds', "Опоздание тика", buckets=(0.001, 0.01))
+    lateness.observe(0.005)
+    return registry
+
+
+def test_collect_is_picklable():
+    collected = worker_registry(3).collect()
+    assert pickle.loads(pickle.dumps(collected)) == collected
+
+
+def test_remote_samples_get_source_labels():
+    front = MetricsRegistry()
+    front.gauge('clients_connected', "Подключенные клиенты", lambda: 7)
+    front.histogram('tick_lateness_seconds', "Опоздание тика", buckets=(0.001, 0.01))
+    front.update_remote({'worker': 0}, worker_registry(3).collect())
+    front.update_remote({'worker': 1}, worker_registry(5).collect())
+
+    lines = front.render().splitlines()
+    assert 'clients_connected 7' in lines
+    assert 'players_active{worker="0"} 3' in lines
+    assert 'players_active{worker="1"} 5' in lines
+    assert 'tick_lateness_seconds_bucket{worker="1",le="0.01"} 1' in lines
+    assert 'tick_lateness_seconds_count{worker="0"} 1' in lines
+    # Семейство, которое есть и у фронта, и у воркеров, описано один раз
+    assert lines.count('# TYPE tick_lateness_seconds histogram') == 1
+    assert lines.count('# TYPE players_active gauge') == 1
+
+
+def test_newer_snapshot_replaces_older():
+    front = MetricsRegistry()
+    front.update_remote({'worker': 0}, worker_registry(3).collect())
+    front.update_remote({'worker': 0}, worker_registry(1).collect())
+    lines = front.render().splitlines()
+    assert 'players_active{worker="0"} 1' in lines
+    assert 'players_active{worker="0"} 3' not in lines
+
+
+def test_worker_exports_level_pool_through_front():
+    worker = RoomWorker(None, 30)
+    worker.ensure_room(0)
+    names = {name for name, _, _, _ in worker.metrics.collect()}
+    assert {'level_pool_depth', 'level_pool_refill_rate', 'level_pool_misses',
+            'rooms_active', 'tick_rate_achieved'} <= names
+    # Трафик и сокеты считает фронт, у воркера их нет
+    assert 'clients_connected' not in names
+
+    front = MetricsRegistry()
+    front.update_remote({'worker': 2}, worker.metrics.collect())
+    lines = front.render().splitlines()
+    assert 'rooms_active{worker="2"} 1' in lines
+    assert any(line.startswith('level_pool_misses{worker="2"} ') for line in lines)
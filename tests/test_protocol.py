@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from protocol import (FORMAT_BINARY, FORMAT_JSON, FORMATS, HEADER_SIZE, decode_message,
+                      encode_message, read_frames)
+
+# Значения с плавающей точкой точно представимы во float32 бинарных записей
+PLAYER = {'id': 3, 'x': 120.5, 'y': 340.25, 'vel_x': -5.0, 'vel_y': 0.75,
+          'health': 80, 'score': 2, 'is_jumping': True, 'input_seq': 4021}
+BULLET = {'id': 17, 'owner_id': 3, 'x': 10.5, 'y': 20.0, 'vel_x': 8.0, 'vel_y': -6.0}
+
+MESSAGES = [
+    {'type': 'state', 'seq': 7,
+     'room': {'id': 2, 'players': {3: PLAYER}, 'bullets': [BULLET],
+              'platforms': [{'x': 0.0, 'y': 580.0, 'width': 800},
+                            {'x': 215.0, 'y': 20.0, 'width': 140}]}},
+    {'type': 'state', 'seq': 1,
+     'room': {'id': 0, 'players': {}, 'bullets': [], 'platforms': []}},
+    {'type': 'delta', 'seq': 9, 'base': 7, 'room_id': 2,
+     'players': {3: PLAYER}, 'players_removed': [],
+     'bullets': {17: BULLET}, 'bullets_removed': []},
+    # Частичные маски: только изменившиеся поля, в том числе первое и последнее
+    {'type': 'delta', 'seq': 10, 'base': 9, 'room_id': 2,
+     'players': {3: {'id': 3, 'x': 130.5, 'input_seq': 4025},
+                 5: {'id': 5, 'health': 40, 'is_jumping': False}},
+     'players_removed': [4],
+     'bullets': {17: {'id': 17, 'vel_y': -5.5}},
+     'bullets_removed': [12, 13]},
+    {'type': 'delta', 'seq': 11, 'base': 10, 'room_id': 2,
+     'players': {}, 'players_removed': [], 'bullets': {}, 'bullets_removed': []},
+    {'type': 'input', 'seq': 812, 't': 4294967295,
+     'left': True, 'right': False, 'jump': True, 'shoot': False},
+    {'type': 'input', 'seq': 813, 't': 1500,
+     'left': False, 'right': True, 'jump': False, 'shoot': True,
+     'mouse_x': 640, 'mouse_y': -1},
+    {'type': 'ack', 'room_id': 2, 'seq': 10},
+    {'type': 'ping', 't': 123456},
+    {'type': 'pong', 't': 0},
+    {'type': 'restart'},
+    {'type': 'restart_success'},
+    {'type': 'change_room', 'room_id': 5},
+    {'type': 'winner', 'player_id': 3},
+    {'type': 'death', 'player_id': 3},
+    {'type': 'low_health', 'player_id': 3},
+]
+
+
+def with_json_keys(message):
+    """Сообщение таким, каким его вернет JSON: ключи словарей - строки"""
+    return json.loads(json.dumps(message))
+
+
+def decode_frame(frame):
+    frames, rest = read_frames(frame)
+    assert rest == b''
+    assert len(frames) == 1
+    return decode_message(frames[0])
+
+
+@pytest.mark.parametrize('message', MESSAGES, ids=lambda message: message['type'])
+def test_binary_round_trip(message):
+    frame = encode_message(message, FORMAT_BINARY)
+    assert frame[HEADER_SIZE:HEADER_SIZE + 1] != b'{'
+    assert decode_frame(frame) == message
+
+
+@pytest.mark.parametrize('message', MESSAGES, ids=lambda message: message['type'])
+def test_json_round_trip(message):
+    frame = encode_message(message, FORMAT_JSON)
+    assert frame[HEADER_SIZE:HEADER_SIZE + 1] == b'{'
+    assert decode_frame(frame) == with_json_keys(message)
+
+
+def test_every_binary_tag_is_covered():
+    tags = {encode_message(message, FORMAT_BINARY)[HEADER_SIZE] for message in MESSAGES}
+    assert tags == set(range(1, 13))
+
+
+def test_unknown_type_falls_back_to_json():
+    message = {'type': 'init', 'player_id': 1, 'room_id': 0,
+               'formats': list(FORMATS), 'tick_rate': 30}
+    frame = encode_message(message, FORMAT_BINARY)
+    assert frame[HEADER_SIZE:HEADER_SIZE + 1] == b'{'
+    assert decode_frame(frame) == message
+
+
+def test_unknown_binary_tag():
+    with pytest.raises(ValueError):
+        decode_message(bytes([200]))
+
+
+def test_read_frames_keeps_partial_tail():
+    first = encode_message({'type': 'ping', 't': 1}, FORMAT_BINARY)
+    second = encode_message({'type': 'ack', 'room_id': 1, 'seq': 2}, FORMAT_JSON)
+    stream = first + second
+
+    frames, rest = read_frames(stream[:len(first) + 3])
+    assert [decode_message(payload) for payload in frames] == [{'type': 'ping', 't': 1}]
+    assert rest == second[:3]
+
+    frames, rest = read_frames(rest + second[3:])
+    assert [decode_message(payload) for payload in frames] == [
+        {'type': 'ack', 'room_id': 1, 'seq': 2}]
+    assert rest == b''
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from core import Player, Room
+from protocol import FORMAT_BINARY, FORMAT_JSON, decode_message, encode_message, read_frames
+from snapshot import SnapshotHistory, apply_delta, diff_states, normalize_state, room_state
+
+
+def player(player_id, **fields):
+    state = {'id': player_id, 'x': 100.0, 'y': 200.0, 'vel_x': 0.0, 'vel_y': 0.0,
+             'health': 100, 'score': 0, 'is_jumping': False, 'input_seq': 0}
+    state.update(fields)
+    return state
+
+
+def bullet(bullet_id, **fields):
+    state = {'id': bullet_id, 'owner_id': 1, 'x': 50.0, 'y': 60.0,
+             'vel_x': 10.0, 'vel_y': 0.0}
+    state.update(fields)
+    return state
+
+
+BASE = {
+    'players': {1: player(1), 2: player(2, x=300.0), 3: player(3, health=20)},
+    'bullets': {10: bullet(10), 11: bullet(11, owner_id=2)},
+}
+CURRENT = {
+    # Игрок 1 сдвинулся, 2 не изменился, 3 вышел, 4 вошел
+    'players': {1: player(1, x=105.5, vel_x=5.0, input_seq=1), 2: player(2, x=300.0),
+                4: player(4, y=20.0)},
+    # Пуля 10 пролетела, 11 исчезла, 12 появилась
+    'bullets': {10: bullet(10, x=60.0), 12: bullet(12, owner_id=4, vel_y=-7.5)},
+}
+
+
+def test_diff_contains_only_changes():
+    delta = diff_states(BASE, CURRENT)
+    assert delta['players'] == {1: {'x': 105.5, 'vel_x': 5.0, 'input_seq': 1},
+                                4: CURRENT['players'][4]}
+    assert delta['players_removed'] == [3]
+    assert delta['bullets'] == {10: {'x': 60.0}, 12: CURRENT['bullets'][12]}
+    assert delta['bullets_removed'] == [11]
+
+
+def test_apply_delta_reproduces_current():
+    assert apply_delta(BASE, diff_states(BASE, CURRENT)) == CURRENT
+
+
+def test_apply_delta_does_not_change_base():
+    before = {kind: {entity_id: dict(fields) for entity_id, fields in entities.items()}
+              for kind, entities in BASE.items()}
+    apply_delta(BASE, diff_states(BASE, CURRENT))
+    assert BASE == before
+
+
+def test_empty_delta():
+    delta = diff_states(CURRENT, CURRENT)
+    assert delta == {'players': {}, 'players_removed': [],
+                     'bullets': {}, 'bullets_removed': []}
+    assert apply_delta(CURRENT, delta) == CURRENT
+
+
+@pytest.mark.parametrize('fmt', [FORMAT_BINARY, FORMAT_JSON])
+def test_delta_survives_the_wire(fmt):
+    message = {'type': 'delta', 'seq': 2, 'base': 1, 'room_id': 0,
+               **diff_states(BASE, CURRENT)}
+    frames, _ = read_frames(encode_message(message, fmt))
+    received = decode_message(frames[0])
+    assert apply_delta(BASE, received) == CURRENT
+
+
+def test_full_state_over_json_is_normalized():
+    frames, _ = read_frames(encode_message(CURRENT, FORMAT_JSON))
+    assert normalize_state(decode_message(frames[0])) == CURRENT
+
+
+def test_room_snapshots_chain():
+    room = Room(0, seed=5)
+    rng = random.Random(5)
+    room.add_player(1, Player(1, 100, 300))
+    room.add_player(2, Player(2, 400, 300))
+    history = SnapshotHistory()
+    history.push(room_state(room))
+
+    for _ in range(20):
+        for state in list(room.players.values()):
+            state.x += rng.uniform(-5, 5)
+            state.input_seq += 1
+            if rng.random() < 0.3:
+                state.fire(room.bullets, rng.uniform(0, 800), rng.uniform(0, 600))
+        room.bullets.step()
+        if rng.random() < 0.2 and 2 in room.players:
+            room.remove_player(2)
+        history.push(room_state(room))
+
+    latest = history.states[history.seq]
+    for base_seq in list(history.states)[:-1]:
+        base = history.states[base_seq]
+        assert apply_delta(base, history.delta_from(base_seq)) == latest